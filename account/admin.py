@@ -1,8 +1,20 @@
 from django.contrib import admin
 
-from account.models import CustomUser
+from account.models import ActivationToken, CustomUser, PendingMail
 
 
 @admin.register(CustomUser)
 class CustomUserAdmin(admin.ModelAdmin):
-    pass
\ No newline at end of file
+    pass
+
+
+@admin.register(PendingMail)
+class PendingMailAdmin(admin.ModelAdmin):
+    list_display = ('recipient', 'subject', 'attempts', 'next_attempt_at')
+
+
+@admin.register(ActivationToken)
+class ActivationTokenAdmin(admin.ModelAdmin):
+    list_display = ('user', 'expires_at')
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
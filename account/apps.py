@@ -5,3 +5,6 @@ class AccountConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'account'
     verbose_name = 'Пользователи'
+
+    def ready(self):
+        from account import signals  # noqa: F401
@@ -0,0 +1,242 @@
+"""
+Аутентификация по токену с кэшированием пары токен -> пользователь.
+
+Токен ищется по очереди:
+- в LRU-кэше процесса (не больше AUTH_TOKEN_LOCAL_SIZE записей, AUTH_TOKEN_LOCAL_TIMEOUT секунд);
+- в общем кэше Django (Redis, AUTH_TOKEN_CACHE_TIMEOUT секунд);
+- в базе данных, после чего попадает в оба кэша.
+
+В кэше хранятся только поля, нужные для аутентификации и проверки прав (USER_FIELDS), без хеша пароля;
+остальные поля пользователя загружаются из базы при первом обращении.
+
+При выходе, удалении токена и любом сохранении пользователя (деактивация, активация, смена пароля)
+запись удаляется из общего кэша и кэша текущего процесса. Другие процессы перестают видеть старую
+запись не позже чем через AUTH_TOKEN_LOCAL_TIMEOUT секунд. Чтобы запрос, загрузивший токен из базы
+до изменения, не вернул устаревшую запись в кэш после ее удаления, сброс меняет поколение токена,
+и запись сохраняется, только если поколение не изменилось за время загрузки.
+"""
+import hashlib
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication, get_authorization_header
+from rest_framework.authtoken.models import Token
+
+from account.models import CustomUser
+from core import metrics
+
+TOKEN_KEY = 'auth:token:{}'
+GENERATION_KEY = 'auth:token:generation:{}'
+USER_FIELDS = ('id', 'is_active', 'is_staff', 'is_superuser')
+STATS_KEY = 'auth:token:stats:{}'
+STATS_NAMES = ('local_hits', 'cache_hits', 'misses')
+
+_local = OrderedDict()
+_lock = threading.Lock()
+_counters = Counter()
+
+
+def token_hash(key):
+    # Сам токен в имени ключа Redis не хранится
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def cache_key(key):
+    return TOKEN_KEY.format(token_hash(key))
+
+
+def generation_key(key):
+    return GENERATION_KEY.format(token_hash(key))
+
+
+def count(name):
+    """
+    Увеличивает счетчик процесса и раз в AUTH_TOKEN_STATS_FLUSH обращений переносит счетчики в общий кэш.
+    """
+    with _lock:
+        _counters[name] += 1
+        if sum(_counters.values()) < settings.AUTH_TOKEN_STATS_FLUSH:
+            return
+        pending = dict(_counters)
+        _counters.clear()
+    flush_stats(pending)
+
+
+def flush_stats(pending):
+    for name, value in pending.items():
+        key = STATS_KEY.format(name)
+        if not cache.add(key, value, timeout=None):
+            cache.incr(key, value)
+
+
+def get_stats():
+    """
+    Возвращает счетчики обращений к кэшу токенов всех процессов и долю запросов, обошедшихся без базы.
+    """
+    with _lock:
+        pending = dict(_counters)
+        _counters.clear()
+    flush_stats(pending)
+    totals = cache.get_many([STATS_KEY.format(name) for name in STATS_NAMES])
+    stats = {name: totals.get(STATS_KEY.format(name), 0) for name in STATS_NAMES}
+    lookups = sum(stats.values())
+    stats['hit_rate'] = round((stats['local_hits'] + stats['cache_hits']) / lookups, 4) if lookups else None
+    return stats
+
+
+def get_token(key):
+    cache_name = cache_key(key)
+    with _lock:
+        entry = _local.get(cache_name)
+        if entry is not None and entry[0] > time.monotonic():
+            _local.move_to_end(cache_name)
+            data = entry[1]
+        else:
+            data = None
+    if data is not None:
+        count('local_hits')
+    else:
+        data = cache.get(cache_name)
+        if data is None:
+            count('misses')
+            return None
+        count('cache_hits')
+        remember(cache_name, data)
+    return build_token(key, data)
+
+
+def build_token(key, data):
+    """
+    Собирает токен и пользователя из записи кэша; каждый запрос получает собственные экземпляры.
+    Поля пользователя вне USER_FIELDS отложены и читаются из базы при обращении.
+    """
+    created, user_values = data
+    user = from_values(CustomUser, dict(zip(USER_FIELDS, user_values)))
+    token = from_values(Token, {'key': key, 'user_id': user.pk, 'created': created})
+    token.user = user
+    return token
+
+
+def from_values(model, values):
+    # from_db ожидает значения в порядке полей модели
+    names = [field.attname for field in model._meta.concrete_fields if field.attname in values]
+    return model.from_db(DEFAULT_DB_ALIAS, names, [values[name] for name in names])
+
+
+def get_generation(key):
+    """
+    Поколение токена; читается до загрузки токена из базы и передается в store_token.
+    """
+    return cache.get(generation_key(key))
+
+
+def store_token(key, token, generation):
+    data = (token.created, tuple(getattr(token.user, field) for field in USER_FIELDS))
+    cache_name = cache_key(key)
+    cache.set(cache_name, data, timeout=settings.AUTH_TOKEN_CACHE_TIMEOUT)
+    if cache.get(generation_key(key)) != generation:
+        # Токен сброшен, пока загружался из базы: сохраненная запись могла устареть
+        cache.delete(cache_name)
+        return
+    remember(cache_name, data)
+
+
+def remember(cache_name, data):
+    with _lock:
+        _local[cache_name] = (time.monotonic() + settings.AUTH_TOKEN_LOCAL_TIMEOUT, data)
+        _local.move_to_end(cache_name)
+        while len(_local) > settings.AUTH_TOKEN_LOCAL_SIZE:
+            _local.popitem(last=False)
+
+
+def forget(*keys):
+    cache_names = [cache_key(key) for key in keys]
+    with _lock:
+        for cache_name in cache_names:
+            _local.pop(cache_name, None)
+    # Новое поколение не дает сохранить запись, загруженную из базы до изменения
+    generation = time.time_ns()
+    cache.set_many({generation_key(key): generation for key in keys}, timeout=settings.AUTH_TOKEN_CACHE_TIMEOUT)
+    cache.delete_many(cache_names)
+
+
+def invalidate_token(key):
+    """
+    Удаляет токен из кэшей после фиксации транзакции.
+    """
+    transaction.on_commit(lambda: forget(key))
+
+
+def invalidate_user(user_id):
+    """
+    Удаляет из кэшей токены пользователя после фиксации транзакции.
+    """
+    keys = list(Token.objects.filter(user_id=user_id).values_list('key', flat=True))
+    if keys:
+        transaction.on_commit(lambda: forget(*keys))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication, который берет токен и пользователя из кэша и обращается к базе только при промахе.
+    """
+
+    def authenticate(self, request):
+        with metrics.measure('auth'):
+            return super().authenticate(request)
+
+    def authenticate_credentials(self, key):
+        token = get_token(key)
+        if token is None:
+            generation = get_generation(key)
+            try:
+                token = Token.objects.select_related('user').get(key=key)
+            except Token.DoesNotExist:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+            store_token(key, token, generation)
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        return token.user, token
+
+    async def aauthenticate(self, request):
+        """
+        Асинхронный вариант authenticate для асинхронных представлений; возвращает пользователя или AnonymousUser.
+
+        Кэш читается в отдельном потоке, при промахе токен загружается асинхронным ORM.
+        """
+        with metrics.measure('auth'):
+            return await self._aauthenticate(request)
+
+    async def _aauthenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return AnonymousUser()
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed(_('Invalid token header. No credentials provided.'))
+        try:
+            key = auth[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed(
+                _('Invalid token header. Token string should not contain invalid characters.'))
+
+        token = await sync_to_async(get_token, thread_sensitive=False)(key)
+        if token is None:
+            generation = await sync_to_async(get_generation, thread_sensitive=False)(key)
+            try:
+                token = await Token.objects.select_related('user').aget(key=key)
+            except Token.DoesNotExist:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+            await sync_to_async(store_token, thread_sensitive=False)(key, token, generation)
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        return token.user
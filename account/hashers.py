@@ -0,0 +1,44 @@
+"""
+Хешеры паролей с параметрами из настроек проекта.
+
+Параметры читаются при каждом обращении, поэтому после их изменения Django сам перехеширует пароль
+при следующем успешном входе пользователя (must_update сравнивает параметры сохраненного хеша с текущими).
+"""
+from django.conf import settings
+from django.contrib.auth.hashers import Argon2PasswordHasher, ScryptPasswordHasher
+
+
+class ConfiguredScryptPasswordHasher(ScryptPasswordHasher):
+    """
+    scrypt: требует work_factor * block_size * 128 байт памяти на хеш; не нужны внешние зависимости.
+    """
+
+    @property
+    def work_factor(self):
+        return settings.PASSWORD_SCRYPT_WORK_FACTOR
+
+    @property
+    def block_size(self):
+        return settings.PASSWORD_SCRYPT_BLOCK_SIZE
+
+    @property
+    def parallelism(self):
+        return settings.PASSWORD_SCRYPT_PARALLELISM
+
+
+class ConfiguredArgon2PasswordHasher(Argon2PasswordHasher):
+    """
+    Argon2id: нужен пакет argon2-cffi.
+    """
+
+    @property
+    def time_cost(self):
+        return settings.PASSWORD_ARGON2_TIME_COST
+
+    @property
+    def memory_cost(self):
+        return settings.PASSWORD_ARGON2_MEMORY_COST
+
+    @property
+    def parallelism(self):
+        return settings.PASSWORD_ARGON2_PARALLELISM
@@ -0,0 +1,72 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import override_settings
+from rest_framework.test import APIRequestFactory
+
+from account.models import CustomUser
+from account.views import LoginView
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    """
+    Замеряет время входа через LoginView для каждого хешера паролей из PASSWORD_HASHER_CLASSES.
+
+    Входы выполняются последовательно в одном потоке, поэтому пропускная способность соответствует
+    одному ядру. Тестовый пользователь создается внутри транзакции и удаляется после замеров.
+
+    Пример:
+        ./manage.py bench_login --logins 200 --hashers pbkdf2 scrypt
+    """
+
+    help = 'Выводит p50/p99 времени входа и количество входов в секунду на ядро для каждого хешера.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=100, help='Количество входов для каждого хешера.')
+        parser.add_argument('--hashers', nargs='+', default=list(settings.PASSWORD_HASHER_CLASSES),
+                            choices=list(settings.PASSWORD_HASHER_CLASSES))
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'Ядер: {os.cpu_count()}\n')
+        self.stdout.write(f'{"хешер":<8} {"p50, мс":>9} {"p99, мс":>9} {"входов/с на ядро":>18}')
+        for name in options['hashers']:
+            hasher = settings.PASSWORD_HASHER_CLASSES[name]
+            with override_settings(PASSWORD_HASHERS=[hasher]):
+                try:
+                    timings = self.measure(options['logins'])
+                except ValueError as error:
+                    # Например, для argon2 не установлен argon2-cffi
+                    self.stdout.write(self.style.WARNING(f'{name:<8} пропущен: {error}'))
+                    continue
+            timings.sort()
+            p50 = timings[len(timings) // 2]
+            p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+            throughput = len(timings) / (sum(timings) / 1000)
+            self.stdout.write(f'{name:<8} {p50:>9.1f} {p99:>9.1f} {throughput:>18.1f}')
+
+    @staticmethod
+    def measure(logins):
+        factory = APIRequestFactory()
+        credentials = {'email': 'bench-login@example.com', 'password': 'bench-password'}
+        view = LoginView.as_view()
+        timings = []
+        try:
+            with transaction.atomic():
+                CustomUser.objects.create_user(**credentials, is_active=True)
+                for _ in range(logins):
+                    request = factory.post('/api/accounts/login/', credentials, format='json')
+                    started = time.perf_counter()
+                    response = view(request)
+                    timings.append((time.perf_counter() - started) * 1000)
+                    if response.status_code != 200:
+                        raise CommandError(f'Вход не выполнен: {response.data}')
+                raise Rollback
+        except Rollback:
+            return timings
@@ -0,0 +1,52 @@
+# Generated by Django 4.2.2 on 2026-10-18 04:24
+
+import datetime
+import hashlib
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils import timezone
+
+
+def move_activation_codes(apps, schema_editor):
+    """
+    Неиспользованные коды активации становятся токенами, чтобы уже отправленные ссылки продолжили работать.
+    """
+    CustomUser = apps.get_model('account', 'CustomUser')
+    ActivationToken = apps.get_model('account', 'ActivationToken')
+    expires_at = timezone.now() + datetime.timedelta(hours=settings.ACTIVATION_TOKEN_LIFETIME)
+    users = CustomUser.objects.filter(is_active=False).exclude(activation_code='').values_list('pk', 'activation_code')
+    ActivationToken.objects.bulk_create([
+        ActivationToken(user_id=pk, token_hash=hashlib.sha256(code.encode()).hexdigest(), expires_at=expires_at)
+        for pk, code in users.iterator()
+    ], batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0004_pendingmail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivationToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token_hash', models.CharField(max_length=64, unique=True)),
+                ('expires_at', models.DateTimeField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activation_tokens', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Токен активации',
+                'verbose_name_plural': 'Токены активации',
+                'indexes': [models.Index(fields=['expires_at'], name='activation_token_expires_idx')],
+            },
+        ),
+        migrations.RunPython(move_activation_codes, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='customuser',
+            name='activation_code',
+        ),
+    ]
@@ -1,8 +1,12 @@
+import datetime
 import hashlib
+import secrets
 
+from django.conf import settings
 from django.contrib.auth.base_user import AbstractBaseUser, BaseUserManager
 from django.contrib.auth.models import PermissionsMixin
 from django.db import models
+from django.utils import timezone
 
 
 class MyUserManager(BaseUserManager):
@@ -20,7 +24,6 @@ class MyUserManager(BaseUserManager):
         email = self.normalize_email(email)
         user = self.model(email=email, **extra_fields)
         user.set_password(password)
-        user.create_activation_code()
         user.save(using=self._db)
         return user
 
@@ -45,7 +48,6 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     first_name = None
     last_name = None
     email = models.EmailField(unique=True)
-    activation_code = models.CharField(max_length=50, blank=True)
 
     objects = MyUserManager()
 
@@ -55,16 +57,74 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = []
 
-    def create_activation_code(self):
+    def __str__(self):
+        return self.email
+
+
+def hash_activation_token(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class ActivationTokenQuerySet(models.QuerySet):
+
+    def issue(self, user):
         """
-        Создает код активации пользователя на основе его электронного адреса и идентификатора.
+        Создает токен активации пользователя и возвращает его; в базе хранится только хеш токена.
         """
+        token = secrets.token_urlsafe(32)
+        self.create(
+            user=user, token_hash=hash_activation_token(token),
+            expires_at=timezone.now() + datetime.timedelta(hours=settings.ACTIVATION_TOKEN_LIFETIME),
+        )
+        return token
+
+    def active(self):
+        return self.filter(expires_at__gt=timezone.now())
+
+    def find(self, token):
+        """
+        Ищет действующий токен по уникальному индексу хеша.
+        """
+        return self.active().filter(token_hash=hash_activation_token(token))
+
+
+class ActivationToken(models.Model):
+    """
+    Токен активации учетной записи. Просроченные токены удаляет задача account.tasks.delete_expired_activation_tokens.
+    """
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='activation_tokens')
+    token_hash = models.CharField(max_length=64, unique=True)
+    expires_at = models.DateTimeField()
 
-        string = self.email + str(self.id)
-        encode_string = string.encode()
-        md5_object = hashlib.md5(encode_string)
-        activation_code = md5_object.hexdigest()
-        self.activation_code = activation_code
+    objects = ActivationTokenQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Токен активации'
+        verbose_name_plural = 'Токены активации'
+        indexes = [
+            models.Index(fields=['expires_at'], name='activation_token_expires_idx'),
+        ]
 
     def __str__(self):
-        return self.email
+        return f'{self.user.email} до {self.expires_at:%Y-%m-%d %H:%M}'
+
+
+class PendingMail(models.Model):
+    """
+    Письмо в очереди на отправку; очередь отправляется пачками задачей account.tasks.flush_mail.
+    """
+    recipient = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Письмо в очереди'
+        verbose_name_plural = 'Очередь писем'
+        indexes = [
+            models.Index(fields=['next_attempt_at', 'id'], name='pending_mail_next_attempt_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.recipient}: {self.subject}'
@@ -1,6 +1,8 @@
+from django.db import transaction
+from django.urls import reverse
 from rest_framework import serializers
 
-from account.models import CustomUser
+from account.models import ActivationToken, CustomUser
 
 
 class RegisterSerializer(serializers.ModelSerializer):
@@ -50,7 +52,7 @@ class RegisterConfirmSerializer(serializers.ModelSerializer):
 
     Методы:
         create(self, validated_data):
-        Создает нового пользователя с заданными данными и отправляет письмо с кодом активации на указанный email.
+        Создает нового пользователя с заданными данными и ставит в очередь письмо с кодом активации на указанный email.
 
     """
     password = serializers.CharField(min_length=6, write_only=True)
@@ -59,12 +61,14 @@ class RegisterConfirmSerializer(serializers.ModelSerializer):
         model = CustomUser
         fields = ('email', 'password')
 
+    @transaction.atomic
     def create(self, validated_data):
         email = validated_data.get('email')
         password = validated_data.get('password')
         send_activation_code = self.context.get('send_activation_code')
         user = CustomUser.objects.create_user(email=email, password=password)
 
-        activation_url = f'http://localhost:2222/api/accounts/register/activate/{user.activation_code}'
-        send_activation_code.delay(email=user.email, activation_url=activation_url)
+        token = ActivationToken.objects.issue(user)
+        activation_url = self.context['request'].build_absolute_uri(reverse('activate', kwargs={'token': token}))
+        send_activation_code(email=user.email, activation_url=activation_url)
         return user
@@ -0,0 +1,23 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from account.authentication import invalidate_token, invalidate_user
+from account.models import CustomUser
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    """
+    Удаляет токен из кэша аутентификации после выхода или удаления пользователя.
+    """
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=CustomUser)
+def user_saved(sender, instance, created, **kwargs):
+    """
+    Удаляет из кэша аутентификации токены пользователя после его изменения: активации, деактивации, смены пароля.
+    """
+    if not created:
+        invalidate_user(instance.pk)
@@ -1,11 +1,28 @@
+import datetime
+import logging
+import smtplib
+
 from celery import shared_task
-from django.core.mail import send_mail
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from account.models import ActivationToken, PendingMail
+
+logger = logging.getLogger(__name__)
+
+FLUSH_SCHEDULED_KEY = 'mail:flush:scheduled'
+FROM_EMAIL = 'press.kenesh@gmail.com'
 
 
-@shared_task
 def send_activation_code(email, activation_url):
     """
-    Отправляет электронное письмо с кодом активации для подтверждения регистрации.
+    Ставит в очередь электронное письмо с кодом активации для подтверждения регистрации.
+
+    Письмо записывается в той же транзакции, что и пользователь, и отправляется задачей flush_mail
+    вместе с другими письмами, накопившимися за MAIL_BATCH_WINDOW секунд.
 
     Параметры:
         email (str): Электронный адрес получателя письма.
@@ -16,10 +33,109 @@ def send_activation_code(email, activation_url):
         Активируйте вашу учетную запись.
         Ссылка для активации: {activation_url}
         """
-    send_mail(
-        'Активируйте вашу учетную запись',
-        message,
-        'press.kenesh@gmail.com',
-        [email, ],
-        fail_silently=False
-    )
+    PendingMail.objects.create(recipient=email, subject='Активируйте вашу учетную запись', body=message)
+    transaction.on_commit(schedule_flush)
+
+
+def schedule_flush(countdown=None):
+    """
+    Планирует отправку очереди, если она еще не запланирована на ближайшее окно.
+    """
+    countdown = settings.MAIL_BATCH_WINDOW if countdown is None else countdown
+    if cache.add(FLUSH_SCHEDULED_KEY, True, timeout=countdown):
+        flush_mail.apply_async(countdown=countdown)
+
+
+@shared_task
+def flush_mail():
+    """
+    Отправляет письма из очереди пачками по MAIL_BATCH_SIZE через одно SMTP-соединение.
+
+    Письмо, которое не удалось отправить, остается в очереди и повторяется через
+    MAIL_RETRY_BACKOFF * 2 ** (попытка - 1) секунд; после MAIL_MAX_ATTEMPTS попыток оно удаляется с ошибкой в журнале.
+    """
+    # Снимаем отметку до выборки: письмо, поставленное в очередь после этого, запланирует новую отправку
+    cache.delete(FLUSH_SCHEDULED_KEY)
+    while send_batch() == settings.MAIL_BATCH_SIZE:
+        pass
+
+    next_attempt_at = PendingMail.objects.order_by('next_attempt_at').values_list('next_attempt_at', flat=True).first()
+    if next_attempt_at is not None:
+        countdown = max((next_attempt_at - timezone.now()).total_seconds(), settings.MAIL_BATCH_WINDOW)
+        transaction.on_commit(lambda: schedule_flush(countdown))
+
+
+def send_batch():
+    """
+    Отправляет одну пачку писем, срок которых подошел, и возвращает ее размер.
+    """
+    with transaction.atomic():
+        batch = list(
+            PendingMail.objects.select_for_update(skip_locked=True)
+            .filter(next_attempt_at__lte=timezone.now())
+            .order_by('next_attempt_at', 'id')[:settings.MAIL_BATCH_SIZE]
+        )
+        if not batch:
+            return 0
+
+        sent, failed = [], []
+        connection = get_connection()
+        try:
+            connection.open()
+        except (smtplib.SMTPException, OSError) as error:
+            logger.warning('SMTP-сервер недоступен: %s', error)
+            failed = batch
+        else:
+            for mail in batch:
+                message = EmailMessage(mail.subject, mail.body, FROM_EMAIL, [mail.recipient], connection=connection)
+                try:
+                    connection.send_messages([message])
+                except (smtplib.SMTPException, OSError) as error:
+                    logger.warning('Письмо %s не отправлено: %s', mail, error)
+                    failed.append(mail)
+                    # После ошибки сервер мог закрыть соединение: следующее письмо отправится через новое
+                    connection.close()
+                    try:
+                        connection.open()
+                    except (smtplib.SMTPException, OSError):
+                        failed += batch[len(sent) + len(failed):]
+                        break
+                else:
+                    sent.append(mail.pk)
+            connection.close()
+
+        PendingMail.objects.filter(pk__in=sent).delete()
+        retry(failed)
+    return len(batch)
+
+
+def retry(mails):
+    now = timezone.now()
+    expired = []
+    for mail in mails:
+        mail.attempts += 1
+        if mail.attempts >= settings.MAIL_MAX_ATTEMPTS:
+            logger.error('Письмо %s не отправлено после %s попыток', mail, mail.attempts)
+            expired.append(mail.pk)
+            continue
+        delay = settings.MAIL_RETRY_BACKOFF * 2 ** (mail.attempts - 1)
+        mail.next_attempt_at = now + datetime.timedelta(seconds=delay)
+    PendingMail.objects.filter(pk__in=expired).delete()
+    PendingMail.objects.bulk_update([mail for mail in mails if mail.pk not in expired],
+                                    ['attempts', 'next_attempt_at'])
+
+
+@shared_task
+def delete_expired_activation_tokens():
+    """
+    Удаляет просроченные токены активации пачками по ACTIVATION_TOKEN_CLEANUP_BATCH, чтобы не держать
+    долгих блокировок, и возвращает количество удаленных токенов.
+    """
+    now = timezone.now()
+    expired = ActivationToken.objects.filter(expires_at__lte=now).order_by('expires_at')
+    deleted = 0
+    while True:
+        batch = list(expired.values_list('pk', flat=True)[:settings.ACTIVATION_TOKEN_CLEANUP_BATCH])
+        if not batch:
+            return deleted
+        deleted += ActivationToken.objects.filter(pk__in=batch).delete()[0]
@@ -1,3 +1,213 @@
-from django.test import TestCase
+import datetime
+import smtplib
 
-# Create your tests here.
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework import exceptions
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from account import authentication
+from account.authentication import CachedTokenAuthentication
+from account.models import ActivationToken, CustomUser, PendingMail
+from account.tasks import delete_expired_activation_tokens, flush_mail, send_activation_code
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+                   AUTH_TOKEN_STATS_FLUSH=1)
+class CachedTokenAuthenticationTest(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        authentication._local.clear()
+        self.user = CustomUser.objects.create_user(email='reader@gmail.com', password='1234', is_active=True)
+        self.token = Token.objects.create(user=self.user)
+        self.auth = CachedTokenAuthentication()
+
+    def test_token_is_cached(self):
+        with self.assertNumQueries(1):
+            self.auth.authenticate_credentials(self.token.key)
+        with self.assertNumQueries(0):
+            user, token = self.auth.authenticate_credentials(self.token.key)
+        self.assertEqual((user.pk, token.key), (self.user.pk, self.token.key))
+
+        # Другой процесс: кэша процесса нет, но запись есть в общем кэше
+        authentication._local.clear()
+        with self.assertNumQueries(0):
+            self.auth.authenticate_credentials(self.token.key)
+        self.assertEqual(authentication.get_stats(),
+                         {'local_hits': 1, 'cache_hits': 1, 'misses': 1, 'hit_rate': 0.6667})
+
+    def test_logout_invalidates_token(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.assertEqual(self.client.get('/api/books/favorite/').status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post('/api/accounts/logout/').status_code, 204)
+        self.assertEqual(self.client.get('/api/books/favorite/').status_code, 401)
+
+    def test_deactivation_invalidates_token(self):
+        self.auth.authenticate_credentials(self.token.key)
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.auth.authenticate_credentials(self.token.key)
+
+    def test_cache_holds_no_password(self):
+        self.auth.authenticate_credentials(self.token.key)
+        cached = repr(cache.get(authentication.cache_key(self.token.key)))
+        self.assertNotIn(self.user.password, cached)
+        self.assertNotIn(self.user.email, cached)
+
+        with self.assertNumQueries(0):
+            user, token = self.auth.authenticate_credentials(self.token.key)
+        self.assertEqual((user.pk, user.is_active, user.is_staff, token.user_id),
+                         (self.user.pk, True, False, self.user.pk))
+        # Остальные поля читаются из базы при обращении
+        with self.assertNumQueries(1):
+            self.assertEqual(user.email, self.user.email)
+
+    def test_invalidation_during_load_is_not_overwritten(self):
+        # Запрос прочитал поколение и загрузил токен из базы, затем пользователь был деактивирован
+        generation = authentication.get_generation(self.token.key)
+        token = Token.objects.select_related('user').get(key=self.token.key)
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        authentication.store_token(self.token.key, token, generation)
+
+        self.assertIsNone(cache.get(authentication.cache_key(self.token.key)))
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.auth.authenticate_credentials(self.token.key)
+
+    def test_stats_are_admin_only(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.assertEqual(self.client.get('/api/accounts/auth-cache-stats/').status_code, 403)
+
+
+@override_settings(PASSWORD_SCRYPT_WORK_FACTOR=2 ** 10)
+class PasswordRehashTest(APITestCase):
+
+    def login(self):
+        response = self.client.post('/api/accounts/login/', {'email': 'reader@gmail.com', 'password': '1234'})
+        self.assertEqual(response.status_code, 200)
+        return CustomUser.objects.get(email='reader@gmail.com').password
+
+    def test_old_hash_is_upgraded_on_login(self):
+        with override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.PBKDF2PasswordHasher']):
+            CustomUser.objects.create_user(email='reader@gmail.com', password='1234', is_active=True)
+        self.assertTrue(CustomUser.objects.get().password.startswith('pbkdf2_sha256$'))
+        self.assertTrue(self.login().startswith('scrypt$'))
+
+    def test_changed_parameters_are_applied_on_login(self):
+        CustomUser.objects.create_user(email='reader@gmail.com', password='1234', is_active=True)
+        with override_settings(PASSWORD_SCRYPT_WORK_FACTOR=2 ** 11):
+            self.assertTrue(self.login().startswith(f'scrypt${2 ** 11}$'))
+
+
+class FlakyEmailBackend(EmailBackend):
+    """
+    Почтовый бэкенд в памяти, который считает соединения и отклоняет адреса из refused.
+    """
+
+    connections = 0
+    refused = set()
+
+    def open(self):
+        FlakyEmailBackend.connections += 1
+        return True
+
+    def send_messages(self, messages):
+        for message in messages:
+            if set(message.to) & self.refused:
+                raise smtplib.SMTPRecipientsRefused({address: (550, b'') for address in message.to})
+        return super().send_messages(messages)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+                   EMAIL_BACKEND='account.tests.FlakyEmailBackend',
+                   MAIL_BATCH_SIZE=3, MAIL_RETRY_BACKOFF=30, MAIL_MAX_ATTEMPTS=2)
+class ActivationMailTest(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        FlakyEmailBackend.connections = 0
+        FlakyEmailBackend.refused = set()
+
+    def test_registration_queues_mail(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post('/api/accounts/register-confirm/',
+                                        {'email': 'reader@gmail.com', 'password': '123456'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(len(mail.outbox), 0)
+
+        flush_mail()
+        self.assertEqual(mail.outbox[0].to, ['reader@gmail.com'])
+        self.assertIn('/api/accounts/register/activate/', mail.outbox[0].body)
+        self.assertFalse(PendingMail.objects.exists())
+
+    def test_batches_reuse_connection(self):
+        for number in range(7):
+            send_activation_code(f'reader{number}@gmail.com', f'http://localhost/activate/{number}')
+        flush_mail()
+        self.assertEqual(len(mail.outbox), 7)
+        # Пачки по 3 письма: одно соединение на пачку
+        self.assertEqual(FlakyEmailBackend.connections, 3)
+
+    def test_failed_mail_is_retried_with_backoff(self):
+        FlakyEmailBackend.refused = {'bad@gmail.com'}
+        for email in ('first@gmail.com', 'bad@gmail.com', 'last@gmail.com'):
+            send_activation_code(email, 'http://localhost/activate/')
+        with self.captureOnCommitCallbacks() as callbacks, self.assertLogs('account.tasks', 'WARNING'):
+            flush_mail()
+        self.assertEqual([message.to[0] for message in mail.outbox], ['first@gmail.com', 'last@gmail.com'])
+        self.assertEqual(len(callbacks), 1)
+
+        pending = PendingMail.objects.get()
+        self.assertEqual((pending.recipient, pending.attempts), ('bad@gmail.com', 1))
+        self.assertGreater(pending.next_attempt_at, timezone.now() + datetime.timedelta(seconds=25))
+
+        # Повтор после задержки; вторая неудача исчерпывает попытки
+        PendingMail.objects.update(next_attempt_at=timezone.now())
+        with self.assertLogs('account.tasks', 'ERROR'):
+            flush_mail()
+        self.assertFalse(PendingMail.objects.exists())
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+                   ACTIVATION_TOKEN_CLEANUP_BATCH=2)
+class ActivationTokenTest(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(email='reader@gmail.com', password='123456')
+
+    def test_registration_link_activates_user(self):
+        self.client.post('/api/accounts/register-confirm/', {'email': 'new@gmail.com', 'password': '123456'})
+        flush_mail()
+        url = mail.outbox[0].body.split('Ссылка для активации: ')[1].split()[0]
+        self.assertTrue(url.startswith('http://testserver/api/accounts/register/activate/'))
+
+        response = self.client.get(url)
+        self.assertRedirects(response, 'http://testserver/api/accounts/login/', fetch_redirect_response=False)
+        self.assertTrue(CustomUser.objects.get(email='new@gmail.com').is_active)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_token_is_stored_hashed(self):
+        token = ActivationToken.objects.issue(self.user)
+        self.assertFalse(ActivationToken.objects.filter(token_hash=token).exists())
+        self.assertTrue(ActivationToken.objects.find(token).exists())
+
+    def test_expired_token_is_rejected_and_cleaned_up(self):
+        tokens = [ActivationToken.objects.issue(self.user) for _ in range(5)]
+        ActivationToken.objects.exclude(token_hash=ActivationToken.objects.find(tokens[0]).get().token_hash).update(
+            expires_at=timezone.now() - datetime.timedelta(minutes=1))
+        self.assertEqual(self.client.get(f'/api/accounts/register/activate/{tokens[1]}/').status_code, 404)
+
+        self.assertEqual(delete_expired_activation_tokens(), 4)
+        self.assertEqual(ActivationToken.objects.count(), 1)
+        self.assertFalse(CustomUser.objects.get().is_active)
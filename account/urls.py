@@ -1,10 +1,14 @@
 from django.urls import path
 
-from account.views import RegisterView, LoginView, ActivateView, RegisterConfirmView
+from account.views import (
+    RegisterView, LoginView, LogoutView, ActivateView, RegisterConfirmView, AuthCacheStatsView,
+)
 
 urlpatterns = [
     path('register/', RegisterView.as_view()),
     path('login/', LoginView.as_view(), name='login'),
+    path('logout/', LogoutView.as_view(), name='logout'),
     path('register-confirm/', RegisterConfirmView.as_view()),
-    path('register/activate/<str:activation_code>/', ActivateView.as_view()),
+    path('register/activate/<str:token>/', ActivateView.as_view(), name='activate'),
+    path('auth-cache-stats/', AuthCacheStatsView.as_view(), name='auth-cache-stats'),
 ]
\ No newline at end of file
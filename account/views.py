@@ -1,15 +1,19 @@
 from django.core import exceptions
 
 from django.contrib.auth import authenticate
+from django.db import transaction
 from django.shortcuts import redirect
+from django.urls import reverse
 
 from rest_framework import exceptions, status
 from rest_framework.generics import GenericAPIView, get_object_or_404
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.authtoken.models import Token
 
-from account.models import CustomUser
+from account.authentication import get_stats
+from account.models import ActivationToken
 from account.serializers import RegisterSerializer, LoginSerializer, RegisterConfirmSerializer
 from account.tasks import send_activation_code
 
@@ -76,6 +80,46 @@ class LoginView(APIView):
         })
 
 
+class LogoutView(APIView):
+    """
+    Представление для выхода пользователя.
+
+    Методы:
+        post
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        """
+        Удаляет токен пользователя; вместе с ним токен удаляется и из кэша аутентификации.
+
+        Возвращаемое значение:
+            Response: Пустой ответ со статусом 204.
+        """
+
+        Token.objects.filter(user=request.user).delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class AuthCacheStatsView(APIView):
+    """
+    Представление со счетчиками кэша аутентификации по токену.
+
+    Методы:
+        get
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        """
+        Возвращает количество попаданий в кэш процесса, в общий кэш и промахов, а также долю попаданий.
+        """
+
+        return Response(get_stats())
+
+
 class RegisterConfirmView(GenericAPIView):
     """
     Представление для подтверждения регистрации пользователей.
@@ -113,23 +157,25 @@ class ActivateView(APIView):
     Представление для активации учетной записи пользователя.
 
     Методы:
-        get(self, request, activation_code): Активирует учетную запись пользователя по коду активации.
+        get(self, request, token): Активирует учетную запись пользователя по токену активации.
     """
 
-    def get(self, request, activation_code):
+    @transaction.atomic
+    def get(self, request, token):
         """
-        Активирует учетную запись пользователя по коду активации.
+        Активирует учетную запись пользователя по токену активации.
 
         Параметры:
             request (Request): Запрос.
-            activation_code (str): Код активации учетной записи пользователя.
+            token (str): Токен активации из письма; ищется по индексу хеша среди не просроченных токенов.
 
         Возвращаемое значение:
             HttpResponseRedirect: Перенаправляет пользователя на страницу входа после успешной активации.
         """
 
-        user = get_object_or_404(CustomUser, activation_code=activation_code)
+        activation = get_object_or_404(ActivationToken.objects.find(token).select_related('user'))
+        user = activation.user
         user.is_active = True
-        user.activation_code = ''
-        user.save()
-        return redirect(request.build_absolute_uri('/api/accounts/login'))
+        user.save(update_fields=['is_active'])
+        user.activation_tokens.all().delete()
+        return redirect(request.build_absolute_uri(reverse('login')))
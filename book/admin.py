@@ -1,41 +1,94 @@
-from django.contrib import admin, messages
-from django.db.models import Avg
+from django.contrib import admin
 
 from book.models import *
+from core.paginator import EstimatedCountPaginator
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Список большой таблицы: количество строк по оценке планировщика и без второго подсчета
+    всех строк таблицы рядом с количеством найденных.
+    """
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class UserBookSearchMixin:
+    """
+    Поиск записей с книгой и пользователем по индексам: число — ID книги, иначе — email пользователя.
+    """
+
+    search_fields = ('user__email',)
+    search_help_text = 'ID книги или email пользователя'
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        # isdigit() пропускает надстрочные цифры вроде '²', которые int() не разбирает
+        if search_term.isdecimal():
+            return queryset.filter(book_id=int(search_term)), False
+        return queryset.filter(user__email=search_term), False
 
 
 @admin.register(Genre)
 class GenreAdmin(admin.ModelAdmin):
-    pass
+    search_fields = ('name',)
 
 
 @admin.register(Author)
 class AuthorAdmin(admin.ModelAdmin):
-    pass
+    search_fields = ('full_name',)
 
 
 @admin.register(Book)
-class BookAdmin(admin.ModelAdmin):
+class BookAdmin(LargeTableAdmin):
+    # Средний рейтинг хранится в книге, жанр и автор читаются тем же запросом
     list_display = ['id', 'title', 'author', 'genre', 'publication_date', 'average_rating']
+    list_select_related = ('author', 'genre')
+    autocomplete_fields = ('genre', 'author')
+    date_hierarchy = 'publication_date'
+    search_fields = ('title',)
+    search_help_text = 'Полнотекстовый поиск по названию, описанию и автору'
 
-    def average_rating(self, obj):
-        return obj.reviews.aggregate(Avg('rating'))['rating__avg']
+    def get_queryset(self, request):
+        return super().get_queryset(request).defer('search_vector')
 
-    average_rating.short_description = 'Средний рейтинг'
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск по GIN-индексу поискового вектора вместо LIKE по полям
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        return queryset.search(search_term), False
 
-@admin.register(Review)
-class ReviewAdmin(admin.ModelAdmin):
 
-    def save_model(self, request, obj, form, change):
-        if not (1 <= obj.rating <= 5):
-            return messages.error(request,'Рейтинг должен быть в диапазоне от 1 до 5.')
-        existing_reviews = Review.objects.filter(book=obj.book, user=obj.user)
-        if existing_reviews.exists():
-            return messages.error(request, 'Отзыв от данного пользователя для данной книги уже существует.')
+@admin.register(Review)
+class ReviewAdmin(UserBookSearchMixin, LargeTableAdmin):
+    # Диапазон оценки и единственность отзыва проверяют валидаторы поля и ограничения модели
+    list_display = ('id', 'book', 'user', 'rating')
+    list_select_related = ('book', 'user')
+    raw_id_fields = ('book', 'user')
 
-        super().save_model(request, obj, form, change)
+    def get_queryset(self, request):
+        return super().get_queryset(request).defer('book__description', 'book__search_vector')
 
 
 @admin.register(Favorite)
-class FavoriteAdmin(admin.ModelAdmin):
-    pass
+class FavoriteAdmin(UserBookSearchMixin, LargeTableAdmin):
+    list_display = ('id', 'user', 'book')
+    list_select_related = ('user', 'book')
+    raw_id_fields = ('user', 'book')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).defer('book__description', 'book__search_vector')
+
+    # Удаление избранного не отправляет сигналов: книги ставятся в очередь пересчета похожих здесь
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        SimilarBookQueue.objects.mark([obj.book_id])
+
+    def delete_queryset(self, request, queryset):
+        book_ids = set(queryset.values_list('book_id', flat=True))
+        super().delete_queryset(request, queryset)
+        SimilarBookQueue.objects.mark(book_ids)
@@ -4,4 +4,7 @@ from django.apps import AppConfig
 class BookConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'book'
-    verbose_name = 'Каталог книг'
\ No newline at end of file
+    verbose_name = 'Каталог книг'
+
+    def ready(self):
+        from book import signals  # noqa: F401
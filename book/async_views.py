@@ -0,0 +1,192 @@
+"""
+Асинхронные варианты каталога, деталей книги и избранного на асинхронном ORM Django.
+
+DRF не поддерживает асинхронные представления, поэтому это обычные async-представления Django. Запрос
+оборачивается в Request DRF только ради разбора параметров и тела; ответы совпадают с синхронными
+эндпоинтами. Под ASGI один воркер обслуживает много запросов, ожидающих базу, одновременно.
+Кэш (Redis) читается в отдельных потоках, чтобы не блокировать цикл событий.
+"""
+import functools
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import models
+from django.http import Http404, HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from django_filters import utils
+from rest_framework import exceptions, status
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from account.authentication import CachedTokenAuthentication
+from book import caching
+from book.facets import parse_facets
+from book.models import Book, Favorite, Review, SimilarBookQueue
+from book.pagination import BookCursorPagination, KeysetPagination
+from book.readers import BookReader, FavoriteReader
+from book.serializers import BookDetailSerializer
+from book.views import BookViewSetDetail, HomeViewSetList, favorites_etag, top_similar
+from core import metrics
+
+in_thread = functools.partial(sync_to_async, thread_sensitive=False)
+
+
+def json_response(data, status_code=status.HTTP_200_OK):
+    if data is None:
+        return HttpResponse(status=status_code)
+    with metrics.measure('serialization'):
+        content = JSONRenderer().render(data)
+    return HttpResponse(content, status=status_code, content_type='application/json')
+
+
+def async_api_view(methods, login_required=False):
+    """
+    Превращает async-функцию (request, ...) -> данные или HttpResponse в представление с аутентификацией
+    по токену и ошибками в формате DRF.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def view(request, *args, **kwargs):
+            if request.method not in methods:
+                return json_response({'detail': f'Метод "{request.method}" не разрешен.'},
+                                     status.HTTP_405_METHOD_NOT_ALLOWED)
+            api_request = Request(request, parsers=[JSONParser()])
+            try:
+                api_request.user = await CachedTokenAuthentication().aauthenticate(request)
+                if login_required and not api_request.user.is_authenticated:
+                    raise exceptions.NotAuthenticated
+                result = await func(api_request, *args, **kwargs)
+            except Http404:
+                result = json_response({'detail': exceptions.NotFound.default_detail}, status.HTTP_404_NOT_FOUND)
+            except exceptions.APIException as error:
+                detail = error.detail if isinstance(error.detail, (list, dict)) else {'detail': error.detail}
+                result = json_response(detail, error.status_code)
+                if isinstance(error, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+                    result['WWW-Authenticate'] = CachedTokenAuthentication.keyword
+            if not isinstance(result, HttpResponse):
+                result = json_response(result)
+            return result
+        view.csrf_exempt = True
+        return view
+    return decorator
+
+
+async def amark_favorites(books, user):
+    """
+    Асинхронный вариант mark_favorites.
+    """
+    if not user.is_authenticated:
+        return
+    favorite_ids = {book_id async for book_id in Favorite.objects.filter(
+        user=user, book_id__in=[book['id'] for book in books],
+    ).values_list('book_id', flat=True)}
+    for book in books:
+        book['is_favorite'] = book['id'] in favorite_ids
+
+
+@async_api_view(['GET'])
+async def home(request):
+    """
+    Асинхронный вариант /api/books/home/ с теми же параметрами и ответом.
+    """
+    view = HomeViewSetList(request=request, format_kwarg=None)
+    filterset = view.filterset_class(request.query_params, queryset=view.get_queryset(), request=request)
+    if not filterset.is_valid():
+        raise utils.translate_validation(filterset.errors)
+    facets = parse_facets(request.query_params)
+
+    key = await in_thread(caching.home_key)(request, filterset.normalized)
+    data = await in_thread(caching.get)(key)
+    if data is None:
+        paginator = BookCursorPagination()
+        ordering_fields = [field.lstrip('-') for field in paginator.get_ordering(view)]
+        rows = filterset.qs.values(*dict.fromkeys(BookReader.values + tuple(ordering_fields)))
+        page = await paginator.apaginate_queryset(rows, request, view=view)
+        with metrics.measure('serialization'):
+            data = paginator.get_paginated_response(BookReader(request).many(page)).data
+        await in_thread(caching.store)(key, data)
+    if facets:
+        # Счетчики считаются одним запросом без асинхронного аналога: в потоке соединений с базой
+        data['facets'] = await sync_to_async(view.get_facets)(filterset, facets)
+    await amark_favorites(data['results'], request.user)
+    return data
+
+
+@async_api_view(['GET'])
+async def book_detail(request, pk):
+    """
+    Асинхронный вариант /api/books/book-detail/<id>/.
+    """
+    key = await in_thread(caching.detail_key)(pk)
+    data = await in_thread(caching.get)(key)
+    if data is None:
+        try:
+            book = await BookViewSetDetail.queryset.aget(pk=pk)
+        except Book.DoesNotExist:
+            raise Http404
+        latest_reviews = Review.objects.filter(book_id=pk).select_related('user').order_by('-id')
+        book.latest_reviews = [review async for review in latest_reviews[:settings.BOOK_DETAIL_REVIEWS].aiterator()]
+        similar = top_similar().filter(book_id=pk)[:settings.SIMILAR_BOOKS_COUNT]
+        book.top_similar = [entry async for entry in similar.aiterator()]
+        with metrics.measure('serialization'):
+            data = BookDetailSerializer(book, context={'request': request}).data
+        await in_thread(caching.store)(key, data)
+    return data
+
+
+@async_api_view(['GET', 'POST'], login_required=True)
+async def favorites(request):
+    """
+    Асинхронный вариант /api/books/favorite/: GET — список избранного с ETag, POST — добавление книги.
+    """
+    if request.method == 'POST':
+        return await add_favorite(request)
+
+    favorites = Favorite.objects.filter(user=request.user)
+    paginator = KeysetPagination()
+    page_key = paginator.page_key(request)
+
+    state = await favorites.aaggregate(count=models.Count('id'), last_id=models.Max('id'))
+    catalog_version = await in_thread(caching.catalog_version)()
+    etag = favorites_etag(state, catalog_version, page_key)
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = json_response(None, status.HTTP_304_NOT_MODIFIED)
+    else:
+        page = await paginator.apaginate_queryset(favorites.values(*FavoriteReader.values), request)
+        with metrics.measure('serialization'):
+            data = paginator.get_paginated_response(FavoriteReader().many(page)).data
+        response = json_response(data)
+
+    response['ETag'] = etag
+    patch_vary_headers(response, ['Authorization'])
+    return response
+
+
+async def add_favorite(request):
+    book_id = request.data.get('book_id')
+    if not book_id:
+        return json_response({'error': 'Не указан ID книги'}, status.HTTP_400_BAD_REQUEST)
+    try:
+        book = await Book.objects.only('id').aget(id=book_id)
+    except (Book.DoesNotExist, ValueError):
+        return json_response({'error': 'Книга с указанным ID не найдена'}, status.HTTP_404_NOT_FOUND)
+    favorite, created = await Favorite.objects.aget_or_create(user=request.user, book=book)
+    # Favorite.save() молча пропускает дубликат, добавленный параллельным запросом после проверки
+    if not created or favorite.pk is None:
+        return json_response({'error': 'Книга уже добавлена в избранное'}, status.HTTP_400_BAD_REQUEST)
+    row = await Favorite.objects.filter(pk=favorite.pk).values(*FavoriteReader.values).aget()
+    return json_response(FavoriteReader().to_representation(row), status.HTTP_201_CREATED)
+
+
+@async_api_view(['DELETE'], login_required=True)
+async def favorite_detail(request, pk):
+    """
+    Асинхронный вариант DELETE /api/books/favorite/<book_id>/.
+    """
+    deleted, _ = await Favorite.objects.filter(user=request.user, book_id=pk).adelete()
+    if not deleted:
+        return json_response({'error': 'Эта книга не находится в избранном'}, status.HTTP_404_NOT_FOUND)
+    await sync_to_async(SimilarBookQueue.objects.mark)([pk])
+    return json_response(None, status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,95 @@
+"""
+Кэш ответов каталога с версионированными ключами.
+
+Ключ ответа содержит номер версии данных, от которых он зависит. При изменении данных версия
+увеличивается, и старые записи просто перестают читаться и вытесняются по таймауту:
+- версия каталога меняется при любом изменении книг, жанров, авторов и отзывов (список книг);
+- версия книги меняется при изменении самой книги и ее отзывов (детали книги);
+- версия справочников меняется при изменении жанров и авторов (детали всех книг).
+
+Признак is_favorite в кэш не попадает: он накладывается на общий ответ для каждого пользователя.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+CATALOG_VERSION_KEY = 'books:version:catalog'
+TAXONOMY_VERSION_KEY = 'books:version:taxonomy'
+BOOK_VERSION_KEY = 'books:version:book:{}'
+
+
+def get_versions(*keys):
+    """
+    Возвращает текущие версии для ключей одним обращением к кэшу.
+    """
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        # Начальная версия берется от времени, чтобы после вытеснения ключа она не совпала с прежней
+        initial = time.time_ns()
+        for key in missing:
+            cache.add(key, initial, timeout=None)
+        versions.update(cache.get_many(missing))
+    return [versions.get(key, 0) for key in keys]
+
+
+def bump_versions(*keys):
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), timeout=None)
+
+
+def invalidate_books(book_ids):
+    """
+    Сбрасывает закэшированный каталог и детали перечисленных книг после фиксации транзакции.
+    """
+    keys = [CATALOG_VERSION_KEY] + [BOOK_VERSION_KEY.format(book_id) for book_id in set(book_ids)]
+    transaction.on_commit(lambda: bump_versions(*keys))
+
+
+def invalidate_taxonomy():
+    """
+    Сбрасывает весь закэшированный каталог после изменения жанров или авторов.
+    """
+    transaction.on_commit(lambda: bump_versions(CATALOG_VERSION_KEY, TAXONOMY_VERSION_KEY))
+
+
+def catalog_version():
+    version, = get_versions(CATALOG_VERSION_KEY)
+    return version
+
+
+def home_key(request, filters):
+    """
+    Ключ страницы каталога: версия каталога, нормализованные фильтры и остальные параметры запроса.
+    """
+    params = sorted((name, sorted(values)) for name, values in request.query_params.lists() if name not in filters)
+    # Адрес входит в ключ: ссылки next/previous в ответе строятся от него
+    raw = repr((request.build_absolute_uri(request.path), sorted(filters.items()), params)).encode()
+    return f'books:home:{catalog_version()}:{hashlib.md5(raw).hexdigest()}'
+
+
+def facets_key(filters, facets):
+    """
+    Ключ счетчиков каталога: не зависит от страницы, поэтому общий для всех страниц выдачи.
+    """
+    raw = repr((sorted(filters.items()), facets)).encode()
+    return f'books:facets:{catalog_version()}:{hashlib.md5(raw).hexdigest()}'
+
+
+def detail_key(book_id):
+    book_version, taxonomy_version = get_versions(BOOK_VERSION_KEY.format(book_id), TAXONOMY_VERSION_KEY)
+    return f'books:detail:{book_id}:{book_version}:{taxonomy_version}'
+
+
+def get(key):
+    return cache.get(key)
+
+
+def store(key, data):
+    cache.set(key, data, settings.BOOKS_CACHE_TIMEOUT)
@@ -0,0 +1,99 @@
+"""
+Счетчики книг каталога по жанрам, авторам и десятилетиям публикации при текущих фильтрах.
+
+Все запрошенные счетчики считаются одним SQL-запросом по отфильтрованной выборке: в PostgreSQL —
+GROUP BY GROUPING SETS (один проход по выборке), на других базах — объединением группировок
+той же выборки (UNION ALL).
+"""
+from django.conf import settings
+from django.db import connections
+from django.db.models import F, IntegerField
+from django.db.models.functions import Cast, ExtractYear
+from rest_framework.exceptions import ValidationError
+
+# Имя счетчика -> поля значения в ответе и выражения для них; значение определяется первым полем
+FACETS = {
+    'genre': (('id', F('genre_id')), ('name', F('genre__name'))),
+    'author': (('id', F('author_id')), ('full_name', F('author__full_name'))),
+    'decade': (('decade', Cast(ExtractYear('publication_date'), IntegerField()) / 10 * 10),),
+}
+
+
+def parse_facets(query_params):
+    """
+    Читает имена счетчиков из ?facets=genre,author,decade (или повторяющегося параметра).
+    """
+    names = {part.strip() for value in query_params.getlist('facets') for part in value.split(',') if part.strip()}
+    unknown = names - FACETS.keys()
+    if unknown:
+        raise ValidationError({'facets': f'Ожидаются значения из: {", ".join(FACETS)}.'})
+    return [name for name in FACETS if name in names]
+
+
+def column(name, field):
+    return f'facet_{name}_{field}'
+
+
+def facet_counts(queryset, names):
+    """
+    Возвращает {счетчик: [{поля значения..., 'count': количество книг}]} для книг выборки.
+
+    Жанры и авторы упорядочены по убыванию количества книг, в каждом счетчике не больше
+    HOME_FACETS_MAX_VALUES значений; десятилетия упорядочены по возрастанию. Порядок и ограничение
+    применяет база: ROW_NUMBER() по строкам каждого счетчика, поэтому в память не читаются лишние значения.
+    """
+    expressions = {column(name, field): expression for name in names for field, expression in FACETS[name]}
+    sql, params = queryset.order_by().annotate(**expressions).values(*expressions).query.sql_with_params()
+
+    connection = connections[queryset.db]
+    quote = connection.ops.quote_name
+    groups = [[quote(column(name, field)) for field, expression in FACETS[name]] for name in names]
+    columns = [name for group in groups for name in group]
+    flags = [quote(column(name, 'grouping')) for name in names]
+    count = quote('facet_count')
+
+    # Строка счетчиков: признаки группировки (0 у счетчика строки), колонки всех счетчиков, количество
+    if connection.vendor == 'postgresql':
+        grouping = ', '.join(f'GROUPING({group[0]}) AS {flag}' for group, flag in zip(groups, flags))
+        sets = ', '.join(f'({", ".join(group)})' for group in groups)
+        counts = (f'SELECT {grouping}, {", ".join(columns)}, COUNT(*) AS {count} FROM ({sql}) books '
+                  f'GROUP BY GROUPING SETS ({sets})')
+    else:
+        parts = []
+        for group in groups:
+            grouping = ', '.join(f'{0 if other is group else 1} AS {flag}' for other, flag in zip(groups, flags))
+            selected = ', '.join(name if name in group else f'NULL AS {name}' for name in columns)
+            parts.append(f'SELECT {grouping}, {selected}, COUNT(*) AS {count} FROM ({sql}) books '
+                         f'GROUP BY {", ".join(group)}')
+        counts = ' UNION ALL '.join(parts)
+        params = params * len(groups)
+
+    # Место значения в своем счетчике: десятилетия по возрастанию, остальные по убыванию количества и по id.
+    # В строке заполнены колонки только ее счетчика, поэтому COALESCE выбирает id нужного счетчика.
+    order = [f'{count} DESC']
+    ids = [group[0] for name, group in zip(names, groups) if name != 'decade']
+    if ids:
+        order.append(f'COALESCE({", ".join(ids)})' if len(ids) > 1 else ids[0])
+    limited = 'facet_rank <= %s'
+    if 'decade' in names:
+        decade = names.index('decade')
+        order.insert(0, f'CASE WHEN {flags[decade]} = 0 THEN {groups[decade][0]} END')
+        limited += f' OR {flags[decade]} = 0'
+    statement = (f'SELECT {", ".join(flags)}, {", ".join(columns)}, {count} FROM ('
+                 f'SELECT counts.*, ROW_NUMBER() OVER (PARTITION BY {", ".join(flags)} ORDER BY {", ".join(order)}) '
+                 f'AS facet_rank FROM ({counts}) counts) ranked WHERE {limited} ORDER BY facet_rank')
+
+    with connection.cursor() as cursor:
+        cursor.execute(statement, [*params, settings.HOME_FACETS_MAX_VALUES])
+        rows = cursor.fetchall()
+
+    result = {name: [] for name in names}
+    offsets = [len(names)]
+    for name in names:
+        offsets.append(offsets[-1] + len(FACETS[name]))
+    for row in rows:
+        index = row[:len(names)].index(0)
+        fields = [field for field, expression in FACETS[names[index]]]
+        values = row[offsets[index]:offsets[index + 1]]
+        result[names[index]].append({**dict(zip(fields, values)), 'count': row[-1]})
+    return result
@@ -0,0 +1,107 @@
+from django import forms
+from django_filters import rest_framework as filters
+
+from book.models import Book
+
+
+class IdListWidget(forms.Widget):
+    """
+    Читает идентификаторы из повторяющегося параметра и/или списка через запятую:
+    ?genre_id=1&genre_id=2 и ?genre_id=1,2 дают одно и то же значение.
+    """
+
+    def value_from_datadict(self, data, files, name):
+        values = data.getlist(name) if hasattr(data, 'getlist') else [data.get(name)]
+        return [part.strip() for value in values if value for part in value.split(',') if part.strip()]
+
+    def value_omitted_from_data(self, data, files, name):
+        return name not in data
+
+
+class IdListField(forms.Field):
+    widget = IdListWidget
+    default_error_messages = {
+        'invalid': 'Ожидается список положительных целых идентификаторов через запятую.',
+        'max_items': 'Можно указать не более %(max_items)s идентификаторов.',
+    }
+
+    def __init__(self, *args, max_items=100, **kwargs):
+        self.max_items = max_items
+        super().__init__(*args, **kwargs)
+
+    def to_python(self, value):
+        if not value:
+            return []
+        try:
+            ids = sorted({int(item) for item in value})
+        except (TypeError, ValueError):
+            raise forms.ValidationError(self.error_messages['invalid'], code='invalid')
+        if ids[0] <= 0:
+            raise forms.ValidationError(self.error_messages['invalid'], code='invalid')
+        if len(ids) > self.max_items:
+            raise forms.ValidationError(self.error_messages['max_items'], code='max_items',
+                                        params={'max_items': self.max_items})
+        return ids
+
+
+class IdListFilter(filters.Filter):
+    """
+    Фильтр field_name IN (...) по списку целых идентификаторов.
+    """
+
+    field_class = IdListField
+
+    def filter(self, qs, value):
+        if not value:
+            return qs
+        return qs.filter(**{f'{self.field_name}__in': value})
+
+
+class BookFilterForm(forms.Form):
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start_date = cleaned_data.get('start_date')
+        end_date = cleaned_data.get('end_date')
+        if start_date and end_date and start_date > end_date:
+            raise forms.ValidationError('Дата начала периода позже даты его окончания.')
+        return cleaned_data
+
+
+class BookFilter(filters.FilterSet):
+    """
+    Фильтры каталога книг. Параметры проверяются до выполнения запросов к базе.
+
+    Параметры запроса:
+    - genre_id: идентификаторы жанров (повторяющийся параметр или список через запятую)
+    - author_id: идентификаторы авторов (повторяющийся параметр или список через запятую)
+    - start_date: публикация не раньше даты (ГГГГ-ММ-ДД), можно без end_date
+    - end_date: публикация не позже даты (ГГГГ-ММ-ДД), можно без start_date
+    - search: полнотекстовый поиск по названию, описанию и автору; результаты упорядочены по релевантности
+    """
+
+    genre_id = IdListFilter(field_name='genre_id')
+    author_id = IdListFilter(field_name='author_id')
+    start_date = filters.DateFilter(field_name='publication_date', lookup_expr='gte')
+    end_date = filters.DateFilter(field_name='publication_date', lookup_expr='lte')
+    search = filters.CharFilter(method='filter_search', max_length=200)
+
+    class Meta:
+        model = Book
+        fields = []
+        form = BookFilterForm
+
+    @property
+    def normalized(self):
+        """
+        Заданные фильтры в каноническом виде, например для ключа кэша.
+        """
+        return {
+            name: value for name, value in sorted(self.form.cleaned_data.items()) if value not in (None, [], '')
+        }
+
+    def filter_search(self, queryset, name, value):
+        """
+        Полнотекстовый поиск с релевантностью rank, см. BookQuerySet.search.
+        """
+        return queryset.search(value)
@@ -0,0 +1,114 @@
+"""
+Вспомогательные функции для нагрузочных команд: генерация синтетического каталога и HTTP-нагрузка.
+"""
+import datetime
+import http.client
+import random
+import threading
+import time
+from collections import Counter
+
+from book.models import Author, Book, Genre
+
+WORDS = (
+    'детектив сыщик убийство поезд вокзал загадка тайна улика свидетель подозреваемый наследство остров '
+    'деревня поместье завещание яд письмо дневник путешествие война любовь семья дружба предательство '
+    'море город ночь зима лето дорога история память судьба надежда страх сон мечта королева капитан '
+    'murder mystery detective train station secret witness island village letter journey war love'
+).split()
+
+
+def random_text(rnd, words):
+    return ' '.join(rnd.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def seed_catalog(books, genres=50, authors=5000, batch_size=5000, seed=0, stdout=None):
+    """
+    Создает синтетический каталог через bulk_create и возвращает (genre_ids, author_ids).
+    """
+    rnd = random.Random(seed)
+    genre_ids = [genre.pk for genre in Genre.objects.bulk_create(
+        [Genre(name=f'Жанр {number}') for number in range(genres)])]
+    author_ids = []
+    for start in range(0, authors, batch_size):
+        author_ids += [author.pk for author in Author.objects.bulk_create(
+            [Author(full_name=f'Автор {number} {rnd.choice(WORDS).capitalize()}')
+             for number in range(start, min(start + batch_size, authors))])]
+
+    first_day = datetime.date(1900, 1, 1).toordinal()
+    last_day = datetime.date(2024, 12, 31).toordinal()
+    started = time.monotonic()
+    for start in range(0, books, batch_size):
+        Book.objects.bulk_create([
+            Book(
+                title=random_text(rnd, 3),
+                genre_id=rnd.choice(genre_ids),
+                author_id=rnd.choice(author_ids),
+                publication_date=datetime.date.fromordinal(rnd.randint(first_day, last_day)),
+                description=random_text(rnd, 60),
+            )
+            for number in range(start, min(start + batch_size, books))
+        ], batch_size=batch_size)
+        if stdout is not None:
+            stdout.write(f'  книг создано: {min(start + batch_size, books)}/{books} '
+                         f'({time.monotonic() - started:.1f} с)')
+    return genre_ids, author_ids
+
+
+def median_ms(func, repeat):
+    """
+    Выполняет func repeat раз и возвращает медианное время в миллисекундах.
+    """
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def run_load(url, concurrency, duration, headers=None):
+    """
+    Запрашивает url (результат urlsplit) в concurrency потоков через постоянные соединения в течение duration секунд.
+
+    Возвращает отсортированные задержки успешных запросов в мс, счетчик статусов и ошибок и фактическое время.
+    """
+    deadline = time.monotonic() + duration
+    timings, statuses, lock = [], Counter(), threading.Lock()
+    path = url.path + (f'?{url.query}' if url.query else '')
+
+    def client():
+        connection_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+        connection = connection_class(url.hostname, url.port, timeout=30)
+        local_timings, local_statuses = [], Counter()
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                connection.request('GET', path, headers=headers or {})
+                response = connection.getresponse()
+                response.read()
+                local_statuses[response.status] += 1
+            except (OSError, http.client.HTTPException) as error:
+                local_statuses[type(error).__name__] += 1
+                connection.close()
+                time.sleep(0.1)
+                continue
+            local_timings.append((time.perf_counter() - started) * 1000)
+        connection.close()
+        with lock:
+            timings.extend(local_timings)
+            statuses.update(local_statuses)
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    timings.sort()
+    return timings, statuses, time.monotonic() - started
+
+
+def percentile(timings, fraction):
+    return timings[min(len(timings) - 1, int(len(timings) * fraction))]
@@ -0,0 +1,106 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from book.management.commands._catalog import percentile, run_load
+from book.models import Book
+
+DEPLOYMENTS = {
+    # Синхронные эндпоинты DRF под WSGI и их асинхронные варианты под ASGI
+    'wsgi': ('core.wsgi:application', 'gthread', '/api/books/'),
+    'asgi': ('core.asgi:application', 'uvicorn.workers.UvicornWorker', '/api/books/async/'),
+}
+
+
+class Command(BaseCommand):
+    """
+    Сравнивает пропускную способность синхронных эндпоинтов под gunicorn (WSGI) и асинхронных под uvicorn (ASGI)
+    при большом числе одновременных клиентов. Серверы запускаются командой на свободных портах с той же базой.
+
+    Пример:
+        ./manage.py bench_asgi --concurrency 64 --duration 15 --no-cache
+    """
+
+    help = 'Сравнивает запросы в секунду и задержки каталога и деталей книги под WSGI и ASGI.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=64, help='Количество одновременных клиентов.')
+        parser.add_argument('--duration', type=float, default=10, help='Длительность каждого замера в секундах.')
+        parser.add_argument('--workers', type=int, default=1, help='Количество воркеров gunicorn.')
+        parser.add_argument('--no-cache', action='store_true',
+                            help='Отключить кэш ответов, чтобы каждый запрос обращался к базе.')
+
+    def handle(self, *args, **options):
+        book_id = Book.objects.order_by('pk').values_list('pk', flat=True).first()
+        if book_id is None:
+            raise CommandError('Каталог пуст: загрузите книги командой import_catalog.')
+        endpoints = {'каталог': 'home/', 'детали книги': f'book-detail/{book_id}/'}
+
+        results = []
+        for name, (application, worker_class, prefix) in DEPLOYMENTS.items():
+            port = self.free_port()
+            with self.server(application, worker_class, port, options):
+                for endpoint, path in endpoints.items():
+                    url = urlsplit(f'http://127.0.0.1:{port}{prefix}{path}')
+                    timings, statuses, elapsed = run_load(
+                        url, options['concurrency'], options['duration'], {'Accept': 'application/json'})
+                    if not timings:
+                        raise CommandError(f'{name}: ни один запрос не выполнен: {dict(statuses)}')
+                    results.append((name, endpoint, len(timings) / elapsed,
+                                    percentile(timings, 0.5), percentile(timings, 0.99)))
+
+        self.stdout.write(f'\n{"сервер":<6} {"эндпоинт":<14} {"запросов/с":>11} {"p50, мс":>9} {"p99, мс":>9}')
+        for name, endpoint, throughput, p50, p99 in results:
+            self.stdout.write(f'{name:<6} {endpoint:<14} {throughput:>11.1f} {p50:>9.1f} {p99:>9.1f}')
+
+    @staticmethod
+    def free_port():
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            return sock.getsockname()[1]
+
+    def server(self, application, worker_class, port, options):
+        env = dict(os.environ)
+        if options['no_cache']:
+            env['BOOKS_CACHE_TIMEOUT'] = '0'
+        if application.endswith('asgi:application'):
+            # Под ASGI постоянные соединения не переиспользуются и копятся (Django #33497)
+            env['CONN_MAX_AGE'] = '0'
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', application, '-k', worker_class, '-w', str(options['workers']),
+             '-b', f'127.0.0.1:{port}', '--access-logfile', os.devnull],
+            cwd=settings.BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        return RunningServer(process, port)
+
+
+class RunningServer:
+    """
+    Контекстный менеджер: ждет, пока сервер начнет принимать соединения, и останавливает его при выходе.
+    """
+
+    def __init__(self, process, port, timeout=30):
+        self.process, self.port, self.timeout = process, port, timeout
+
+    def __enter__(self):
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise CommandError('Сервер завершился при запуске.')
+            try:
+                socket.create_connection(('127.0.0.1', self.port), timeout=1).close()
+                return self
+            except OSError:
+                time.sleep(0.2)
+        self.process.terminate()
+        raise CommandError('Сервер не запустился.')
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        self.process.wait()
@@ -0,0 +1,113 @@
+import datetime
+import itertools
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from book.management.commands._catalog import median_ms, seed_catalog
+from book.models import Book
+from book.pagination import BookCursorPagination
+
+
+# Составные индексы фильтров каталога и замененные ими одиночные индексы внешних ключей
+FILTER_INDEXES = ('book_genre_pub_date_idx', 'book_author_pub_date_idx')
+FK_INDEXES = (('book_book_genre_id_idx', 'genre_id'), ('book_book_author_id_idx', 'author_id'))
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    """
+    Замеряет запросы каталога для всех сочетаний фильтров с составными индексами каталога и на прежней схеме,
+    где вместо них были одиночные индексы внешних ключей genre и author.
+
+    Каталог создается внутри транзакции и по умолчанию откатывается вместе с удалением индексов,
+    поэтому команду можно запускать на рабочей базе разработчика.
+
+    Пример:
+        ./manage.py bench_home_filters --books 1000000 --compare
+    """
+
+    help = 'Выводит планы EXPLAIN и время запросов каталога для каждого сочетания фильтров.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=200000, help='Количество создаваемых книг.')
+        parser.add_argument('--repeat', type=int, default=20, help='Количество повторов каждого запроса.')
+        parser.add_argument('--page-size', type=int, default=BookCursorPagination.page_size)
+        parser.add_argument('--compare', action='store_true',
+                            help='Повторить замеры на схеме без составных индексов каталога.')
+        parser.add_argument('--keep', action='store_true', help='Не откатывать созданный каталог.')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                if not options['keep']:
+                    raise Rollback
+        except Rollback:
+            self.stdout.write('Тестовый каталог удален.')
+
+    def run(self, options):
+        self.stdout.write(f'Создание каталога из {options["books"]} книг...')
+        genre_ids, author_ids = seed_catalog(options['books'], stdout=self.stdout)
+        self.analyze()
+
+        filters = {
+            'genre': {'genre_id__in': genre_ids[:2]},
+            'author': {'author_id__in': author_ids[:2]},
+            'dates': {'publication_date__range': (datetime.date(1967, 1, 1), datetime.date(1972, 12, 31))},
+        }
+        combinations = [()]
+        for size in range(1, len(filters) + 1):
+            combinations += itertools.combinations(filters, size)
+
+        before = self.measure('с индексами', combinations, filters, options)
+        if options['compare']:
+            with transaction.atomic():
+                quote = connection.ops.quote_name
+                with connection.cursor() as cursor:
+                    for name in FILTER_INDEXES:
+                        cursor.execute(f'DROP INDEX IF EXISTS {quote(name)}')
+                    for name, column in FK_INDEXES:
+                        cursor.execute(f'CREATE INDEX {quote(name)} ON {quote(Book._meta.db_table)} ({quote(column)})')
+                self.analyze()
+                after = self.measure('индексы внешних ключей', combinations, filters, options)
+                transaction.set_rollback(True)
+
+            self.stdout.write('\nИтог, медиана в мс:')
+            for combination in combinations:
+                name = self.combination_name(combination)
+                self.stdout.write(f'  {name:<22} {before[name]:>9.2f} составные индексы'
+                                  f' | {after[name]:>9.2f} индексы внешних ключей')
+
+    def measure(self, title, combinations, filters, options):
+        self.stdout.write(self.style.MIGRATE_HEADING(f'\n=== {title} ==='))
+        results = {}
+        for combination in combinations:
+            queryset = Book.objects.select_related('genre', 'author')
+            for name in combination:
+                queryset = queryset.filter(**filters[name])
+            queryset = queryset.order_by(*BookCursorPagination.ordering)[:options['page_size'] + 1]
+
+            name = self.combination_name(combination)
+            results[name] = median_ms(lambda: list(queryset.all()), options['repeat'])
+            self.stdout.write(self.style.SQL_KEYWORD(f'\n{name}: {results[name]:.2f} мс'))
+            self.stdout.write(self.explain(queryset))
+        return results
+
+    @staticmethod
+    def combination_name(combination):
+        return '+'.join(combination) or 'без фильтров'
+
+    @staticmethod
+    def explain(queryset):
+        if connection.vendor == 'postgresql':
+            return queryset.explain(analyze=True, buffers=True)
+        return queryset.explain()
+
+    @staticmethod
+    def analyze():
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
@@ -0,0 +1,121 @@
+import datetime
+import io
+import json
+import os
+import random
+import tempfile
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from book.management.commands._catalog import WORDS, random_text
+from book.models import Author, Book, Genre
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    """
+    Сравнивает загрузку каталога командой import_catalog и loaddata.
+
+    Генерирует NDJSON-файл с books книгами и фикстуру dumpdata с первыми loaddata_books из них,
+    загружает фикстуру обеими командами и весь NDJSON через import_catalog. Все загруженное откатывается.
+
+    Пример:
+        ./manage.py bench_import --books 1000000 --loaddata-books 10000
+    """
+
+    help = 'Сравнивает скорость загрузки каталога через import_catalog и loaddata.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=1000000, help='Количество книг для import_catalog.')
+        parser.add_argument('--loaddata-books', type=int, default=10000,
+                            help='Количество книг для сравнения с loaddata.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--genres', type=int, default=50)
+        parser.add_argument('--authors', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(0)
+        genres = [f'Жанр {number}' for number in range(options['genres'])]
+        authors = [f'Автор {number} {rnd.choice(WORDS).capitalize()}' for number in range(options['authors'])]
+        first_day = datetime.date(1900, 1, 1).toordinal()
+        last_day = datetime.date(2024, 12, 31).toordinal()
+        books = (
+            {
+                'title': random_text(rnd, 3),
+                'genre': rnd.choice(genres),
+                'author': rnd.choice(authors),
+                'publication_date': datetime.date.fromordinal(rnd.randint(first_day, last_day)).isoformat(),
+                'description': random_text(rnd, 30),
+            }
+            for _ in range(options['books'])
+        )
+
+        with tempfile.TemporaryDirectory() as directory:
+            ndjson_path = os.path.join(directory, 'books.ndjson')
+            fixture_path = os.path.join(directory, 'books.json')
+            self.stdout.write(f'Генерация файла из {options["books"]} книг...')
+            fixture = []
+            with open(ndjson_path, 'w', encoding='utf-8') as file:
+                for number, book in enumerate(books):
+                    file.write(json.dumps(book, ensure_ascii=False) + '\n')
+                    if number < options['loaddata_books']:
+                        fixture.append(book)
+            self.write_fixture(fixture_path, fixture, genres, authors)
+            self.stdout.write(f'Размер NDJSON: {os.path.getsize(ndjson_path) / 2 ** 20:.0f} МБ')
+
+            results = [
+                ('loaddata', len(fixture), self.measure(lambda: call_command('loaddata', fixture_path, verbosity=0))),
+                ('import_catalog', len(fixture), self.measure(lambda: self.import_catalog(fixture_path, options))),
+                ('import_catalog', options['books'], self.measure(lambda: self.import_catalog(ndjson_path, options))),
+            ]
+
+        self.stdout.write(f'\n{"команда":<16} {"книг":>9} {"время, с":>10} {"книг/с":>10}')
+        for name, count, elapsed in results:
+            self.stdout.write(f'{name:<16} {count:>9} {elapsed:>10.1f} {count / elapsed:>10,.0f}')
+        self.stdout.write('Загруженные данные удалены.')
+
+    @staticmethod
+    def write_fixture(path, books, genres, authors):
+        """
+        Фикстура в формате dumpdata; идентификаторы начинаются после уже существующих в базе.
+        """
+        def start(model):
+            return (model.objects.aggregate(value=Max('pk'))['value'] or 0) + 1
+
+        genre_ids = {name: pk for pk, name in enumerate(genres, start(Genre))}
+        author_ids = {name: pk for pk, name in enumerate(authors, start(Author))}
+        # loaddata сохраняет объекты как есть, поэтому auto_now поле нужно заполнить в самой фикстуре
+        updated_at = timezone.now().isoformat()
+        records = [{'model': 'book.genre', 'pk': pk, 'fields': {'name': name}} for name, pk in genre_ids.items()]
+        records += [{'model': 'book.author', 'pk': pk, 'fields': {'full_name': name}}
+                    for name, pk in author_ids.items()]
+        records += [
+            {'model': 'book.book', 'pk': pk, 'fields': dict(
+                book, genre=genre_ids[book['genre']], author=author_ids[book['author']], updated_at=updated_at)}
+            for pk, book in enumerate(books, start(Book))
+        ]
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(records, file, ensure_ascii=False, indent=2)
+
+    @staticmethod
+    def import_catalog(path, options):
+        call_command('import_catalog', path, batch_size=options['batch_size'], restart=True, stdout=io.StringIO())
+
+    @staticmethod
+    def measure(func):
+        try:
+            with transaction.atomic():
+                started = time.perf_counter()
+                func()
+                elapsed = time.perf_counter() - started
+                raise Rollback
+        except Rollback:
+            return elapsed
@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Q
+
+from book.filters import BookFilter
+from book.management.commands._catalog import median_ms, seed_catalog
+from book.models import Book
+from book.pagination import BookCursorPagination
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    """
+    Сравнивает полнотекстовый поиск по GIN-индексу с поиском подстроки (icontains) на синтетическом каталоге.
+
+    Каталог создается внутри транзакции и откатывается после замеров. Нужен PostgreSQL.
+
+    Пример:
+        ./manage.py bench_search --books 500000
+    """
+
+    help = 'Сравнивает время полнотекстового поиска и поиска через icontains.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=200000, help='Количество создаваемых книг.')
+        parser.add_argument('--repeat', type=int, default=10, help='Количество повторов каждого запроса.')
+        parser.add_argument('--page-size', type=int, default=BookCursorPagination.page_size)
+        parser.add_argument('--terms', nargs='+', default=['убийство', 'тайна острова', 'поезда', 'murder'],
+                            help='Поисковые запросы.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Полнотекстовый поиск доступен только в PostgreSQL.')
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            self.stdout.write('Тестовый каталог удален.')
+
+    def run(self, options):
+        self.stdout.write(f'Создание каталога из {options["books"]} книг...')
+        seed_catalog(options['books'], stdout=self.stdout)
+        Book.objects.refresh_search_vectors()
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        limit = options['page_size'] + 1
+        self.stdout.write(f'\n{"запрос":<20} {"найдено":>9} {"FTS, мс":>10} {"icontains, мс":>14}')
+        for term in options['terms']:
+            books = Book.objects.select_related('genre', 'author').defer('search_vector')
+            search = BookFilter({'search': term}, queryset=books).qs.order_by('-rank', '-id')[:limit]
+            scan = books.filter(
+                Q(title__icontains=term) | Q(description__icontains=term) | Q(author__full_name__icontains=term)
+            ).order_by(*BookCursorPagination.ordering)[:limit]
+
+            found = BookFilter({'search': term}, queryset=Book.objects.all()).qs.count()
+            search_ms = median_ms(lambda: list(search.all()), options['repeat'])
+            scan_ms = median_ms(lambda: list(scan.all()), options['repeat'])
+            self.stdout.write(f'{term:<20} {found:>9} {search_ms:>10.2f} {scan_ms:>14.2f}')
+
+        self.stdout.write('\nПлан полнотекстового поиска:')
+        self.stdout.write(search.explain(analyze=True))
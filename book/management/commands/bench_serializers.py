@@ -0,0 +1,69 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from book.models import Author, Book, Genre
+from book.readers import BookReader
+from book.serializers import BookSerializer
+
+
+class Command(BaseCommand):
+    """
+    Сравнивает скорость BookSerializer и BookReader на одинаковых данных в памяти, без запросов к базе.
+
+    Пример:
+        ./manage.py bench_serializers --rows 50000
+    """
+
+    help = 'Сравнивает количество сериализуемых строк в секунду для BookSerializer и BookReader.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=20000, help='Количество книг.')
+        parser.add_argument('--repeat', type=int, default=5, help='Количество повторов замера.')
+
+    def handle(self, *args, **options):
+        request = APIRequestFactory().get('/api/books/home/')
+        genre = Genre(id=1, name='Детективы')
+        author = Author(id=1, full_name='Агата Кристи')
+        books, rows = [], []
+        for number in range(1, options['rows'] + 1):
+            book = Book(
+                id=number, title=f'Книга {number}', genre=genre, author=author,
+                publication_date=datetime.date(1970, 1, 1) + datetime.timedelta(days=number % 20000),
+                description='Описание книги ' * 20, reviews_count=number % 7,
+                average_rating=(number % 50) / 10 or None,
+            )
+            books.append(book)
+            rows.append({name: self.value(book, name) for name in BookReader.values})
+
+        renderer = JSONRenderer()
+        expected = renderer.render(BookSerializer(books[:1000], many=True, context={'request': request}).data)
+        if renderer.render(BookReader(request).many(rows[:1000])) != expected:
+            raise CommandError('BookReader и BookSerializer дают разный JSON.')
+
+        serializer_rate = self.rate(
+            lambda: BookSerializer(books, many=True, context={'request': request}).data, options)
+        reader_rate = self.rate(lambda: BookReader(request).many(rows), options)
+        self.stdout.write(f'BookSerializer: {serializer_rate:>12,.0f} строк/с')
+        self.stdout.write(f'BookReader:     {reader_rate:>12,.0f} строк/с')
+        self.stdout.write(self.style.SUCCESS(f'Ускорение: x{reader_rate / serializer_rate:.1f}'))
+
+    @staticmethod
+    def value(book, name):
+        obj = book
+        for part in name.split('__'):
+            obj = getattr(obj, part)
+        return obj
+
+    @staticmethod
+    def rate(func, options):
+        best = None
+        for _ in range(options['repeat']):
+            started = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return options['rows'] / best
@@ -0,0 +1,39 @@
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from book.management.commands._catalog import percentile, run_load
+
+
+class Command(BaseCommand):
+    """
+    Нагрузочный тест запущенного сервера: несколько потоков в течение заданного времени запрашивают
+    один адрес через постоянные HTTP-соединения и считают пропускную способность и задержки.
+
+    Сравнение runserver и gunicorn:
+        ./manage.py runserver 0.0.0.0:2222 и ./manage.py load_test http://localhost:2222/api/books/home/
+        gunicorn core.wsgi:application и ./manage.py load_test http://localhost:2222/api/books/home/
+    """
+
+    help = 'Нагружает адрес запросами GET и выводит количество запросов в секунду и задержки p50/p99.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', help='Адрес, например http://localhost:2222/api/books/home/')
+        parser.add_argument('--concurrency', type=int, default=16, help='Количество параллельных клиентов.')
+        parser.add_argument('--duration', type=float, default=10, help='Длительность теста в секундах.')
+        parser.add_argument('--token', help='Токен для заголовка Authorization.')
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['url'])
+        if url.scheme not in ('http', 'https') or not url.hostname:
+            raise CommandError('Ожидается адрес http(s)://хост[:порт]/путь')
+        headers = {'Accept': 'application/json'}
+        if options['token']:
+            headers['Authorization'] = f'Token {options["token"]}'
+
+        timings, statuses, elapsed = run_load(url, options['concurrency'], options['duration'], headers)
+        if not timings:
+            raise CommandError(f'Ни один запрос не выполнен: {dict(statuses)}')
+        self.stdout.write(f'Запросов: {len(timings)} за {elapsed:.1f} с, ответы: {dict(statuses)}')
+        self.stdout.write(f'p50: {percentile(timings, 0.5):.1f} мс, p99: {percentile(timings, 0.99):.1f} мс')
+        self.stdout.write(self.style.SUCCESS(f'Пропускная способность: {len(timings) / elapsed:,.1f} запросов/с'))
@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Avg, Count, F, Q, Sum
+from django.db.models.functions import Abs, Coalesce
+
+from book.models import Book
+
+
+class Command(BaseCommand):
+    """
+    Пересчитывает и проверяет денормализованные агрегаты рейтинга книг.
+
+    Пример:
+        ./manage.py rebuild_book_ratings
+        ./manage.py rebuild_book_ratings --check
+    """
+
+    help = 'Пересчитывает количество отзывов, сумму оценок и средний рейтинг книг.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Только проверить агрегаты и завершиться с ошибкой при расхождениях.')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Количество книг, пересчитываемых одним запросом.')
+
+    def handle(self, *args, **options):
+        if options['check']:
+            return self.check_ratings()
+
+        batch_size = options['batch_size']
+        book_ids = Book.objects.order_by('pk').values_list('pk', flat=True)
+        updated = 0
+        last_id = 0
+        while True:
+            batch = list(book_ids.filter(pk__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            updated += Book.objects.filter(pk__in=batch).refresh_ratings()
+            last_id = batch[-1]
+        self.stdout.write(self.style.SUCCESS(f'Пересчитано книг: {updated}'))
+
+    def check_ratings(self):
+        books = Book.objects.annotate(
+            actual_count=Count('reviews'),
+            actual_sum=Coalesce(Sum('reviews__rating'), 0),
+            actual_average=Avg('reviews__rating'),
+        ).annotate(
+            average_diff=Abs(F('average_rating') - F('actual_average')),
+        )
+        mismatched = books.filter(
+            ~Q(reviews_count=F('actual_count'))
+            | ~Q(rating_sum=F('actual_sum'))
+            | Q(average_diff__gt=1e-6)
+            | Q(average_rating__isnull=True, actual_count__gt=0)
+            | Q(average_rating__isnull=False, actual_count=0)
+        ).order_by('pk')
+
+        count = 0
+        for book in mismatched.iterator():
+            count += 1
+            self.stdout.write(
+                f'Книга {book.pk}: отзывов {book.reviews_count} (факт. {book.actual_count}), '
+                f'сумма {book.rating_sum} (факт. {book.actual_sum}), '
+                f'рейтинг {book.average_rating} (факт. {book.actual_average})'
+            )
+        if count:
+            raise CommandError(f'Найдено книг с неверными агрегатами: {count}. '
+                               f'Запустите команду без --check для пересчета.')
+        self.stdout.write(self.style.SUCCESS('Агрегаты рейтинга всех книг корректны.'))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from book.models import Book, SimilarBookQueue
+from book.tasks import rebuild_similar_books
+
+
+class Command(BaseCommand):
+    """
+    Пересчитывает похожие книги для книг из очереди, как периодическая задача rebuild_similar_books.
+    С --all сначала ставит в очередь все книги с избранным или отзывами (первое заполнение таблицы).
+
+    Пример:
+        ./manage.py rebuild_similar_books --all
+    """
+
+    help = 'Пересчитывает похожие книги по совместному избранному и отзывам.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Пересчитать все книги, а не только измененные.')
+
+    def handle(self, *args, **options):
+        if options['all']:
+            books = Book.objects.filter(Q(reviews__isnull=False) | Q(favorite__isnull=False)).distinct()
+            book_ids = list(books.order_by().values_list('pk', flat=True))
+            for start in range(0, len(book_ids), 10000):
+                SimilarBookQueue.objects.mark(book_ids[start:start + 10000])
+
+        processed = rebuild_similar_books()
+        self.stdout.write(self.style.SUCCESS(f'Пересчитано книг: {processed}'))
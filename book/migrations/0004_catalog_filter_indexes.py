@@ -0,0 +1,80 @@
+# Generated by Django 4.2.2 on 2026-10-18 04:05
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Avg, Count, Min, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def delete_duplicates(apps, schema_editor):
+    """
+    Оставляет по одной (самой ранней) записи избранного и отзыва на пару пользователь-книга.
+    """
+    db_alias = schema_editor.connection.alias
+    Book = apps.get_model('book', 'Book')
+    for model_name in ('Favorite', 'Review'):
+        model = apps.get_model('book', model_name)
+        duplicates = (model.objects.using(db_alias).values('user', 'book')
+                      .annotate(first_id=Min('id'), total=Count('id')).filter(total__gt=1))
+        book_ids = set()
+        for duplicate in duplicates.iterator():
+            model.objects.using(db_alias).filter(
+                user=duplicate['user'], book=duplicate['book'],
+            ).exclude(id=duplicate['first_id']).delete()
+            book_ids.add(duplicate['book'])
+        if model_name == 'Review' and book_ids:
+            reviews = model.objects.filter(book=OuterRef('pk')).order_by().values('book')
+            Book.objects.using(db_alias).filter(pk__in=book_ids).update(
+                reviews_count=Coalesce(Subquery(reviews.annotate(value=Count('pk')).values('value')), 0),
+                rating_sum=Coalesce(Subquery(reviews.annotate(value=Sum('rating')).values('value')), 0),
+                average_rating=Subquery(reviews.annotate(value=Avg('rating')).values('value')),
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('book', '0003_book_pub_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['genre', 'publication_date', 'id'], name='book_genre_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['author', 'publication_date', 'id'], name='book_author_pub_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='favorite',
+            constraint=models.UniqueConstraint(fields=('user', 'book'), name='favorite_user_book_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='review',
+            constraint=models.UniqueConstraint(fields=('user', 'book'), name='review_user_book_unique'),
+        ),
+        migrations.AlterField(
+            model_name='book',
+            name='author',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='book.author', verbose_name='Автор'),
+        ),
+        migrations.AlterField(
+            model_name='book',
+            name='genre',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='book.genre', verbose_name='Жанр'),
+        ),
+        migrations.AlterField(
+            model_name='favorite',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+        migrations.AlterField(
+            model_name='review',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.2.2 on 2026-10-18 04:09
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+class AddPostgresIndex(migrations.AddIndex):
+    """
+    Создает индекс только в PostgreSQL: на других СУБД (например, SQLite в тестах) GIN недоступен.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+def fill_search_vectors(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Book = apps.get_model('book', 'Book')
+    Author = apps.get_model('book', 'Author')
+    author_name = Subquery(Author.objects.filter(pk=OuterRef('author_id')).values('full_name')[:1])
+    vector = None
+    for config in settings.BOOKS_SEARCH_CONFIGS:
+        part = (SearchVector('title', weight='A', config=config)
+                + SearchVector(author_name, weight='A', config=config)
+                + SearchVector('description', weight='B', config=config))
+        vector = part if vector is None else vector + part
+    Book.objects.using(schema_editor.connection.alias).update(search_vector=vector)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0004_catalog_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(fill_search_vectors, migrations.RunPython.noop),
+        AddPostgresIndex(
+            model_name='book',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='book_search_vector_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.2 on 2026-10-18 04:35
+
+import django.core.validators
+from django.db import migrations, models
+from django.db.models import Avg, Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Greatest, Least
+
+
+def clamp_ratings(apps, schema_editor):
+    """
+    Приводит оценки вне диапазона 1–5 к ближайшей границе и пересчитывает рейтинг их книг,
+    иначе ограничение review_rating_range не создастся.
+    """
+    Book = apps.get_model('book', 'Book')
+    Review = apps.get_model('book', 'Review')
+    db = schema_editor.connection.alias
+    invalid = Review.objects.using(db).exclude(rating__gte=1, rating__lte=5)
+    book_ids = set(invalid.values_list('book_id', flat=True))
+    if not book_ids:
+        return
+    invalid.update(rating=Greatest(Least('rating', 5), 1))
+    reviews = Review.objects.using(db).filter(book=OuterRef('pk')).order_by().values('book')
+    Book.objects.using(db).filter(pk__in=book_ids).update(
+        reviews_count=Coalesce(Subquery(reviews.annotate(value=Count('pk')).values('value')), 0),
+        rating_sum=Coalesce(Subquery(reviews.annotate(value=Sum('rating')).values('value')), 0),
+        average_rating=Subquery(reviews.annotate(value=Avg('rating')).values('value')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0008_book_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(clamp_ratings, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='review',
+            name='rating',
+            field=models.IntegerField(validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(5)], verbose_name='Рейтинг'),
+        ),
+        migrations.AddConstraint(
+            model_name='review',
+            constraint=models.CheckConstraint(check=models.Q(('rating__gte', 1), ('rating__lte', 5)), name='review_rating_range'),
+        ),
+    ]
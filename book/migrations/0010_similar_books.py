@@ -0,0 +1,43 @@
+# Generated by Django 4.2.2 on 2026-10-18 04:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0009_review_rating_range'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarBookQueue',
+            fields=[
+                ('book_id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='Книга')),
+                ('marked_at', models.DateTimeField(verbose_name='Дата изменения')),
+            ],
+            options={
+                'verbose_name': 'Книга в очереди похожих',
+                'verbose_name_plural': 'Очередь пересчета похожих книг',
+            },
+        ),
+        migrations.CreateModel(
+            name='SimilarBook',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='Близость')),
+                ('book', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='similar_entries', to='book.book', verbose_name='Книга')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='book.book', verbose_name='Похожая книга')),
+            ],
+            options={
+                'verbose_name': 'Похожая книга',
+                'verbose_name_plural': 'Похожие книги',
+                'indexes': [models.Index(fields=['book', '-score'], name='similar_book_score_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='similarbook',
+            constraint=models.UniqueConstraint(fields=('book', 'similar'), name='similar_book_unique'),
+        ),
+    ]
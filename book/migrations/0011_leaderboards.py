@@ -0,0 +1,35 @@
+# Generated by Django 4.2.2 on 2026-10-18 04:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0010_similar_books'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('rated', 'Лучшие по рейтингу'), ('favorited', 'Чаще в избранном')], max_length=16, verbose_name='Рейтинг')),
+                ('scope', models.CharField(choices=[('all', 'Все книги'), ('genre', 'Жанр'), ('author', 'Автор')], max_length=16, verbose_name='Раздел')),
+                ('scope_id', models.BigIntegerField(default=0, verbose_name='ID жанра или автора')),
+                ('rank', models.PositiveIntegerField(verbose_name='Место')),
+                ('score', models.FloatField(verbose_name='Оценка')),
+                ('refreshed_at', models.DateTimeField(verbose_name='Дата пересчета')),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='book.book', verbose_name='Книга')),
+            ],
+            options={
+                'verbose_name': 'Место в рейтинге',
+                'verbose_name_plural': 'Рейтинги книг',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='leaderboardentry',
+            constraint=models.UniqueConstraint(fields=('kind', 'scope', 'scope_id', 'rank'), name='leaderboard_rank_unique'),
+        ),
+    ]
@@ -1,13 +1,28 @@
 from pyexpat.errors import messages
 
-from django.db import models
+from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, SearchVectorField
+from django.db import connections, models, transaction
+from django.db.models import Avg, Count, F, FloatField, Q, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce, Now
+from django.utils import timezone
 
 from account.models import CustomUser
+from book.caching import invalidate_books
 
 
 class Genre(models.Model):
     name = models.CharField(max_length=100, verbose_name='Название')
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Запоминаем исходное название, чтобы трогать книги только при его изменении
+        instance._loaded_name = dict(zip(field_names, values)).get('name')
+        return instance
+
     def __str__(self):
         return self.name
 
@@ -19,6 +34,13 @@ class Genre(models.Model):
 class Author(models.Model):
     full_name = models.CharField(max_length=255, verbose_name='Полное имя')
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Запоминаем исходное имя, чтобы трогать книги только при его изменении
+        instance._loaded_full_name = dict(zip(field_names, values)).get('full_name')
+        return instance
+
     def __str__(self):
         return self.full_name
 
@@ -27,12 +49,87 @@ class Author(models.Model):
         verbose_name_plural = 'Авторы'
 
 
+def book_search_vector():
+    """
+    Поисковый вектор книги: название и автор с весом A, описание с весом B,
+    в каждой конфигурации из BOOKS_SEARCH_CONFIGS (русская и английская морфология).
+    """
+    author_name = Subquery(Author.objects.filter(pk=models.OuterRef('author_id')).values('full_name')[:1])
+    vectors = [
+        SearchVector('title', weight='A', config=config)
+        + SearchVector(author_name, weight='A', config=config)
+        + SearchVector('description', weight='B', config=config)
+        for config in settings.BOOKS_SEARCH_CONFIGS
+    ]
+    vector = vectors[0]
+    for other in vectors[1:]:
+        vector = vector + other
+    return vector
+
+
+class BookQuerySet(models.QuerySet):
+
+    def refresh_ratings(self):
+        """
+        Пересчитывает количество отзывов, сумму и средний рейтинг книг выборки одним UPDATE.
+        """
+        reviews = Review.objects.filter(book=models.OuterRef('pk')).order_by().values('book')
+        return self.update(
+            reviews_count=Coalesce(Subquery(reviews.annotate(value=Count('pk')).values('value')), 0),
+            rating_sum=Coalesce(Subquery(reviews.annotate(value=Sum('rating')).values('value')), 0),
+            average_rating=Subquery(reviews.annotate(value=Avg('rating')).values('value')),
+            updated_at=Now(),
+        )
+
+    def touch(self):
+        """
+        Отмечает книги выборки измененными, чтобы они попали в инкрементальную выгрузку.
+        """
+        return self.update(updated_at=Now())
+
+    def refresh_search_vectors(self):
+        """
+        Пересчитывает поисковый вектор книг выборки одним UPDATE. Полнотекстовый поиск есть только в PostgreSQL.
+        """
+        if connections[self.db].vendor != 'postgresql':
+            return 0
+        return self.update(search_vector=book_search_vector())
+
+    def search(self, value):
+        """
+        Ищет по поисковому вектору книги (GIN-индекс) и добавляет релевантность rank.
+
+        Запрос разбирается в синтаксисе websearch во всех конфигурациях BOOKS_SEARCH_CONFIGS.
+        Без PostgreSQL выполняется простой поиск подстроки с одинаковой релевантностью.
+        """
+        if connections[self.db].vendor != 'postgresql':
+            return self.filter(
+                Q(title__icontains=value) | Q(description__icontains=value) | Q(author__full_name__icontains=value)
+            ).annotate(rank=Value(1.0, output_field=FloatField()))
+
+        query = None
+        for config in settings.BOOKS_SEARCH_CONFIGS:
+            part = SearchQuery(value, config=config, search_type='websearch')
+            query = part if query is None else query | part
+        # ts_rank возвращает real; приведение к double precision сохраняет точное значение в курсоре пагинации
+        return self.filter(search_vector=query).annotate(
+            rank=Cast(SearchRank(F('search_vector'), query), FloatField()))
+
+
 class Book(models.Model):
     title = models.CharField(max_length=255, verbose_name='Название')
-    genre = models.ForeignKey(Genre, on_delete=models.CASCADE, verbose_name='Жанр')
-    author = models.ForeignKey(Author, on_delete=models.CASCADE, verbose_name='Автор')
+    # Отдельные индексы по FK не нужны: их заменяют составные индексы из Meta
+    genre = models.ForeignKey(Genre, on_delete=models.CASCADE, db_index=False, verbose_name='Жанр')
+    author = models.ForeignKey(Author, on_delete=models.CASCADE, db_index=False, verbose_name='Автор')
     publication_date = models.DateField(verbose_name='Дата публикации')
     description = models.TextField(verbose_name='Описание')
+    reviews_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество отзывов')
+    rating_sum = models.IntegerField(default=0, editable=False, verbose_name='Сумма оценок')
+    average_rating = models.FloatField(null=True, editable=False, verbose_name='Средний рейтинг')
+    search_vector = SearchVectorField(null=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата изменения')
+
+    objects = BookQuerySet.as_manager()
 
     def __str__(self):
         return self.title
@@ -40,29 +137,100 @@ class Book(models.Model):
     class Meta:
         verbose_name = 'Книга'
         verbose_name_plural = 'Книги'
+        indexes = [
+            # Ключ курсорной пагинации каталога
+            models.Index(fields=['publication_date', 'id'], name='book_pub_date_id_idx'),
+            # Фильтры каталога по жанру/автору с диапазоном дат и тем же порядком выдачи
+            models.Index(fields=['genre', 'publication_date', 'id'], name='book_genre_pub_date_idx'),
+            models.Index(fields=['author', 'publication_date', 'id'], name='book_author_pub_date_idx'),
+            GinIndex(fields=['search_vector'], name='book_search_vector_idx'),
+            # Инкрементальная выгрузка каталога
+            models.Index(fields=['updated_at', 'id'], name='book_updated_at_id_idx'),
+        ]
+
+
+class ReviewQuerySet(models.QuerySet):
+    """
+    Массовые операции над отзывами не вызывают сигналы, поэтому агрегаты книг пересчитываются,
+    а кэш каталога сбрасывается здесь.
+    """
+
+    rating_fields = {'rating', 'book', 'book_id'}
+
+    def bulk_create(self, objs, *args, **kwargs):
+        with transaction.atomic(using=self.db):
+            # При update_conflicts существующий отзыв может перейти к другой книге: пересчитывается и прежняя
+            existing = [obj.pk for obj in objs if obj.pk is not None] if kwargs.get('update_conflicts') else []
+            book_ids = set(self.filter(pk__in=existing).values_list('book_id', flat=True)) if existing else set()
+            objs = super().bulk_create(objs, *args, **kwargs)
+            book_ids.update(obj.book_id for obj in objs)
+            Book.objects.filter(pk__in=book_ids).refresh_ratings()
+            SimilarBookQueue.objects.mark(book_ids)
+            invalidate_books(book_ids)
+        return objs
+
+    def update(self, **kwargs):
+        # bulk_update() тоже проходит через update()
+        if not self.rating_fields.intersection(kwargs):
+            return super().update(**kwargs)
+        with transaction.atomic(using=self.db):
+            affected = dict(self.values_list('pk', 'book_id'))
+            rows = super().update(**kwargs)
+            book_ids = set(affected.values())
+            book_ids.update(Review.objects.filter(pk__in=affected).values_list('book_id', flat=True))
+            Book.objects.filter(pk__in=book_ids).refresh_ratings()
+            SimilarBookQueue.objects.mark(book_ids)
+            invalidate_books(book_ids)
+        return rows
 
 
 class Review(models.Model):
-    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='reviews', verbose_name='Книга')
-    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, verbose_name='Пользователь')
-    rating = models.IntegerField(verbose_name='Рейтинг')
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, db_index=False, related_name='reviews',
+                             verbose_name='Книга')
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, db_index=False, verbose_name='Пользователь')
+    rating = models.IntegerField(validators=[MinValueValidator(1), MaxValueValidator(5)], verbose_name='Рейтинг')
     text = models.TextField(verbose_name='Отзыв')
 
+    objects = ReviewQuerySet.as_manager()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Запоминаем исходную книгу, чтобы при переносе отзыва пересчитать и её рейтинг
+        instance._loaded_book_id = dict(zip(field_names, values)).get('book_id')
+        return instance
+
     def __str__(self):
         return f"Отзыв на книгу '{self.book.title}' от {self.user.email}"
 
     class Meta:
         verbose_name = 'Отзыв'
         verbose_name_plural = 'Отзывы'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'book'], name='review_user_book_unique'),
+            models.CheckConstraint(check=models.Q(rating__gte=1, rating__lte=5), name='review_rating_range'),
+        ]
+        indexes = [
+            # Отзывы о книге, новые первыми; заменяет индекс по FK book
+            models.Index(fields=['book', 'id'], name='review_book_id_idx'),
+        ]
 
 
 class Favorite(models.Model):
-    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, verbose_name='Пользователь')
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, db_index=False, verbose_name='Пользователь')
     book = models.ForeignKey(Book, on_delete=models.CASCADE, verbose_name='Книга')
 
     class Meta:
         verbose_name = 'Избранное'
         verbose_name_plural = 'Избранные'
+        constraints = [
+            # Индекс (user, book) полностью покрывает проверку is_favorite в каталоге
+            models.UniqueConstraint(fields=['user', 'book'], name='favorite_user_book_unique'),
+        ]
+        indexes = [
+            # Список избранного пользователя, последние добавленные первыми
+            models.Index(fields=['user', 'id'], name='favorite_user_id_idx'),
+        ]
 
     def __str__(self):
         return f'{self.user.email} - {self.book.title}'
@@ -72,3 +240,93 @@ class Favorite(models.Model):
         if existing_favorites.exists():
             return
         super().save(*args, **kwargs)
+
+
+class SimilarBook(models.Model):
+    """
+    Похожая книга: SIMILAR_BOOKS_COUNT ближайших книг по совместному избранному и отзывам читателей.
+
+    Заполняется задачей rebuild_similar_books; score — косинусная близость книг в диапазоне (0, 1].
+    """
+
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, db_index=False, related_name='similar_entries',
+                             verbose_name='Книга')
+    similar = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+', verbose_name='Похожая книга')
+    score = models.FloatField(verbose_name='Близость')
+
+    class Meta:
+        verbose_name = 'Похожая книга'
+        verbose_name_plural = 'Похожие книги'
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'similar'], name='similar_book_unique'),
+        ]
+        indexes = [
+            # Похожие книги в деталях книги: самые близкие первыми
+            models.Index(fields=['book', '-score'], name='similar_book_score_idx'),
+        ]
+
+
+class SimilarBookQueueQuerySet(models.QuerySet):
+
+    def mark(self, book_ids):
+        """
+        Ставит книги в очередь пересчета похожих книг; повторная отметка обновляет время.
+        """
+        now = timezone.now()
+        return self.bulk_create(
+            [SimilarBookQueue(book_id=book_id, marked_at=now) for book_id in set(book_ids)],
+            update_conflicts=True, unique_fields=['book_id'], update_fields=['marked_at'],
+        )
+
+
+class SimilarBookQueue(models.Model):
+    """
+    Книги, у которых изменились избранное или отзывы после последнего пересчета похожих книг.
+
+    Книга хранится числом без внешнего ключа: отзывы удаляемой книги отмечают ее уже после того,
+    как удаление собрало зависимые записи. Пересчет удаленной книги просто ничего не находит.
+    """
+
+    book_id = models.BigIntegerField(primary_key=True, verbose_name='Книга')
+    marked_at = models.DateTimeField(verbose_name='Дата изменения')
+
+    objects = SimilarBookQueueQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Книга в очереди похожих'
+        verbose_name_plural = 'Очередь пересчета похожих книг'
+
+
+class LeaderboardEntry(models.Model):
+    """
+    Место книги в рейтинге: лучшие по байесовскому рейтингу или по количеству добавлений в избранное,
+    среди всех книг, книг жанра или книг автора.
+
+    Таблица целиком пересчитывается задачей refresh_leaderboards; страница рейтинга читается
+    одним проходом по индексу (kind, scope, scope_id, rank).
+    """
+
+    RATED = 'rated'
+    FAVORITED = 'favorited'
+    KIND_CHOICES = [(RATED, 'Лучшие по рейтингу'), (FAVORITED, 'Чаще в избранном')]
+
+    ALL = 'all'
+    GENRE = 'genre'
+    AUTHOR = 'author'
+    SCOPE_CHOICES = [(ALL, 'Все книги'), (GENRE, 'Жанр'), (AUTHOR, 'Автор')]
+
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES, verbose_name='Рейтинг')
+    scope = models.CharField(max_length=16, choices=SCOPE_CHOICES, verbose_name='Раздел')
+    # Жанр или автор раздела; 0 для рейтинга всех книг
+    scope_id = models.BigIntegerField(default=0, verbose_name='ID жанра или автора')
+    rank = models.PositiveIntegerField(verbose_name='Место')
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+', verbose_name='Книга')
+    score = models.FloatField(verbose_name='Оценка')
+    refreshed_at = models.DateTimeField(verbose_name='Дата пересчета')
+
+    class Meta:
+        verbose_name = 'Место в рейтинге'
+        verbose_name_plural = 'Рейтинги книг'
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'scope', 'scope_id', 'rank'], name='leaderboard_rank_unique'),
+        ]
@@ -0,0 +1,115 @@
+"""
+Быстрая сериализация списков только для чтения.
+
+Ридеры строят ответ из строк QuerySet.values() без экземпляров моделей и полей DRF: перечень колонок
+и преобразования заданы заранее, а адрес книги собирается из шаблона, полученного одним reverse()
+на весь запрос. Результат совпадает байт в байт с ответом соответствующего ModelSerializer
+(без is_favorite, который накладывается отдельно).
+"""
+from rest_framework.fields import DateTimeField
+from rest_framework.reverse import reverse
+
+from book.serializers import round_rating
+
+PK_PLACEHOLDER = '__pk__'
+
+
+class BookReader:
+    """
+    Ридер книг каталога, эквивалентный BookSerializer.
+    """
+
+    values = (
+        'id', 'title', 'publication_date', 'description', 'reviews_count', 'average_rating',
+        'genre_id', 'genre__name', 'author_id', 'author__full_name',
+    )
+
+    def __init__(self, request, format=None):
+        url = reverse('book-detail', kwargs={'pk': PK_PLACEHOLDER}, request=request, format=format)
+        self.url_prefix, self.url_suffix = url.split(PK_PLACEHOLDER)
+
+    def to_representation(self, row):
+        return {
+            'id': row['id'],
+            'url': f'{self.url_prefix}{row["id"]}{self.url_suffix}',
+            'title': row['title'],
+            'publication_date': row['publication_date'].isoformat(),
+            'description': row['description'],
+            'reviews_count': row['reviews_count'],
+            'average_rating': round_rating(row['average_rating']),
+            'genre': {'id': row['genre_id'], 'name': row['genre__name']},
+            'author': {'id': row['author_id'], 'full_name': row['author__full_name']},
+        }
+
+    def many(self, rows):
+        to_representation = self.to_representation
+        return [to_representation(row) for row in rows]
+
+
+class FavoriteReader:
+    """
+    Ридер избранного, эквивалентный FavoriteSerializer.
+    """
+
+    values = (
+        'id', 'book_id', 'book__title',
+        'book__genre_id', 'book__genre__name', 'book__author_id', 'book__author__full_name',
+    )
+
+    def to_representation(self, row):
+        return {
+            'id': row['id'],
+            'book': {
+                'id': row['book_id'],
+                'name': row['book__title'],
+                'genre': {'id': row['book__genre_id'], 'name': row['book__genre__name']},
+                'author': {'id': row['book__author_id'], 'full_name': row['book__author__full_name']},
+            },
+        }
+
+    def many(self, rows):
+        to_representation = self.to_representation
+        return [to_representation(row) for row in rows]
+
+
+class BookExportReader(BookReader):
+    """
+    Ридер выгрузки каталога: поля BookReader и дата изменения книги.
+    """
+
+    values = BookReader.values + ('updated_at',)
+    csv_header = (
+        'id', 'url', 'title', 'publication_date', 'description', 'reviews_count', 'average_rating',
+        'genre_id', 'genre_name', 'author_id', 'author_full_name', 'updated_at',
+    )
+
+    def __init__(self, request, format=None):
+        super().__init__(request, format)
+        self.format_datetime = DateTimeField().to_representation
+
+    def to_representation(self, row):
+        representation = super().to_representation(row)
+        representation['updated_at'] = self.format_datetime(row['updated_at'])
+        return representation
+
+    def to_csv_row(self, row):
+        average = round_rating(row['average_rating'])
+        return (
+            row['id'], f'{self.url_prefix}{row["id"]}{self.url_suffix}', row['title'],
+            row['publication_date'].isoformat(), row['description'], row['reviews_count'],
+            '' if average is None else average,
+            row['genre_id'], row['genre__name'], row['author_id'], row['author__full_name'],
+            self.format_datetime(row['updated_at']),
+        )
+
+
+class LeaderboardReader(BookReader):
+    """
+    Ридер мест рейтинга: место, оценка и книга в представлении BookReader.
+    """
+
+    values = ('rank', 'score') + tuple(f'book__{name}' for name in BookReader.values)
+
+    def to_representation(self, row):
+        book = super().to_representation({name: row[f'book__{name}'] for name in BookReader.values})
+        return {'rank': row['rank'], 'score': round(row['score'], 3), 'book': book}
@@ -0,0 +1,28 @@
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Формат выгрузки: один JSON-объект на строку. Сами данные выгрузки передаются потоком,
+    рендерер используется для выбора формата и для ответов с ошибками.
+    """
+
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return json.dumps(data, ensure_ascii=False).encode() + b'\n'
+
+
+class CSVRenderer(NDJSONRenderer):
+    """
+    Формат выгрузки CSV. Ответы с ошибками отдаются одной строкой JSON.
+    """
+
+    media_type = 'text/csv'
+    format = 'csv'
@@ -1,9 +1,16 @@
-from django.db.models import Avg
+from django.conf import settings
 from rest_framework import serializers
 
 from book.models import *
 
 
+def round_rating(value):
+    """
+    Округляет средний рейтинг до одного знака; у книги без отзывов рейтинга нет.
+    """
+    return round(value, 1) if value is not None else None
+
+
 class BookSerializer(serializers.ModelSerializer):
     """
     Сериализатор для книг.
@@ -18,7 +25,7 @@ class BookSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Book
-        fields = '__all__'
+        exclude = ('rating_sum', 'search_vector', 'updated_at')
 
     def to_representation(self, instance):
         """
@@ -29,8 +36,8 @@ class BookSerializer(serializers.ModelSerializer):
         representation['genre'] = {"id": instance.genre.id, "name": instance.genre.name}
         representation['author'] = {"id": instance.author.id, "full_name": instance.author.full_name}
 
-        # Рассчитываем средний рейтинг книги
-        representation['average_rating'] = round(instance.reviews.aggregate(Avg('rating'))['rating__avg'], 1)
+        # Средний рейтинг хранится в самой книге и пересчитывается при изменении отзывов
+        representation['average_rating'] = round_rating(instance.average_rating)
 
         return representation
 
@@ -47,16 +54,59 @@ class ReviewSerializer(serializers.ModelSerializer):
         fields = ('id', 'user', 'rating', 'text')
 
 
+class ReviewWriteSerializer(serializers.ModelSerializer):
+    """
+    Сериализатор для создания и изменения отзывов текущего пользователя.
+
+    Оценка проверяется валидаторами поля и ограничением review_rating_range в базе. Повторный отзыв на книгу
+    не ищется заранее: его отклоняет ограничение review_user_book_unique при вставке.
+    """
+
+    book = serializers.PrimaryKeyRelatedField(queryset=Book.objects.only('id'))
+
+    class Meta:
+        model = Review
+        fields = ('id', 'book', 'rating', 'text')
+
+    def validate_book(self, value):
+        if self.instance is not None and value.pk != self.instance.book_id:
+            raise serializers.ValidationError('Книгу отзыва изменить нельзя.')
+        return value
+
+
+class SimilarBookSerializer(serializers.ModelSerializer):
+    """
+        Сериализатор для похожих книг.
+    """
+
+    id = serializers.IntegerField(source='similar_id')
+    title = serializers.CharField(source='similar.title')
+    score = serializers.SerializerMethodField()
+
+    class Meta:
+        model = SimilarBook
+        fields = ('id', 'title', 'score')
+
+    def get_score(self, instance):
+        return round(instance.score, 3)
+
+
 class BookDetailSerializer(serializers.ModelSerializer):
     """
        Сериализатор для подробных данных о книгах.
+
+       Поля:
+           reviews: Последние BOOK_DETAIL_REVIEWS отзывов, предзагруженные в атрибут latest_reviews.
+           Остальные отзывы отдаются постранично в /api/books/book-detail/<id>/reviews/.
+           similar_books: SIMILAR_BOOKS_COUNT похожих книг, предзагруженные в атрибут top_similar.
    """
 
-    reviews = ReviewSerializer(many=True)
+    reviews = ReviewSerializer(many=True, source='latest_reviews')
+    similar_books = SimilarBookSerializer(many=True, source='top_similar')
 
     class Meta:
         model = Book
-        fields = '__all__'
+        exclude = ('rating_sum', 'search_vector', 'updated_at')
 
     def to_representation(self, instance):
         """
@@ -66,7 +116,7 @@ class BookDetailSerializer(serializers.ModelSerializer):
         representation = super().to_representation(instance)
         representation['genre'] = {"id": instance.genre.id, "name": instance.genre.name}
         representation['author'] = {"id": instance.author.id, "full_name": instance.author.full_name}
-        representation['average_rating'] = round(instance.reviews.aggregate(Avg('rating'))['rating__avg'], 1)
+        representation['average_rating'] = round_rating(instance.average_rating)
         return representation
 
 
@@ -84,5 +134,30 @@ class FavoriteSerializer(serializers.ModelSerializer):
             Преобразует экземпляр модели в словарь для сериализации.
         """
         representation = super().to_representation(instance)
-        representation['book'] = {"id": instance.book.id, "name": instance.book.title}
-        return representation
\ No newline at end of file
+        book = instance.book
+        representation['book'] = {
+            "id": book.id,
+            "name": book.title,
+            "genre": {"id": book.genre.id, "name": book.genre.name},
+            "author": {"id": book.author.id, "full_name": book.author.full_name},
+        }
+        return representation
+
+
+class FavoriteBulkSerializer(serializers.Serializer):
+    """
+    Сериализатор для массового добавления и удаления избранных книг.
+
+    Поля:
+        book_ids (ListField): Идентификаторы книг, не больше FAVORITES_BULK_MAX_BOOKS.
+    """
+
+    book_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.FAVORITES_BULK_MAX_BOOKS,
+    )
+
+    def validate_book_ids(self, value):
+        # Сохраняем порядок запроса, повторы не нужны
+        return list(dict.fromkeys(value))
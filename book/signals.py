@@ -0,0 +1,97 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from account.models import CustomUser
+from book.caching import invalidate_books, invalidate_taxonomy
+from book.models import Author, Book, Favorite, Genre, Review, SimilarBook, SimilarBookQueue
+
+
+@receiver(post_save, sender=Review)
+def review_saved(sender, instance, **kwargs):
+    """
+    Пересчитывает рейтинг книги после создания или изменения отзыва.
+    """
+    book_ids = {instance.book_id, getattr(instance, '_loaded_book_id', None)} - {None}
+    Book.objects.filter(pk__in=book_ids).refresh_ratings()
+    SimilarBookQueue.objects.mark(book_ids)
+    invalidate_books(book_ids)
+    instance._loaded_book_id = instance.book_id
+
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, **kwargs):
+    """
+    Пересчитывает рейтинг книги после удаления отзыва.
+    """
+    Book.objects.filter(pk=instance.book_id).refresh_ratings()
+    SimilarBookQueue.objects.mark([instance.book_id])
+    invalidate_books([instance.book_id])
+
+
+@receiver(post_save, sender=Favorite)
+def favorite_saved(sender, instance, **kwargs):
+    """
+    Избранное участвует в расчете похожих книг. Удаления отмечаются в представлениях, в админ-панели
+    и при удалении пользователя: обработчик post_delete лишил бы удаление избранного быстрого пути одним DELETE.
+    """
+    SimilarBookQueue.objects.mark([instance.book_id])
+
+
+@receiver(pre_delete, sender=CustomUser)
+def user_deleting(sender, instance, **kwargs):
+    """
+    Избранное пользователя удаляется каскадом без сигналов, поэтому его книги отмечаются заранее.
+    Книги отзывов отмечает review_deleted.
+    """
+    SimilarBookQueue.objects.mark(Favorite.objects.filter(user=instance).values_list('book_id', flat=True))
+
+
+@receiver(post_save, sender=Book)
+def book_saved(sender, instance, **kwargs):
+    Book.objects.filter(pk=instance.pk).refresh_search_vectors()
+    invalidate_books([instance.pk])
+
+
+@receiver(pre_delete, sender=Book)
+def book_deleting(sender, instance, **kwargs):
+    """
+    Книга удаляется из списков похожих каскадом: списки, в которых она была, пересчитываются.
+    """
+    SimilarBookQueue.objects.mark(SimilarBook.objects.filter(similar=instance).values_list('book_id', flat=True))
+
+
+@receiver(post_delete, sender=Book)
+def book_deleted(sender, instance, **kwargs):
+    # Отзывы книги удаляются каскадом и ставят ее саму в очередь, пересчитывать уже нечего
+    SimilarBookQueue.objects.filter(book_id=instance.pk).delete()
+    invalidate_books([instance.pk])
+
+
+@receiver(post_save, sender=Author)
+def author_saved(sender, instance, created=False, **kwargs):
+    """
+    Имя автора входит в поисковый вектор и в выгрузку его книг; книги обновляются, только если имя изменилось.
+    """
+    if not created and instance.full_name != getattr(instance, '_loaded_full_name', None):
+        books = Book.objects.filter(author=instance)
+        books.refresh_search_vectors()
+        books.touch()
+    instance._loaded_full_name = instance.full_name
+
+
+@receiver(post_save, sender=Genre)
+def genre_saved(sender, instance, created=False, **kwargs):
+    """
+    Название жанра входит в выгрузку его книг; книги обновляются, только если название изменилось.
+    """
+    if not created and instance.name != getattr(instance, '_loaded_name', None):
+        Book.objects.filter(genre=instance).touch()
+    instance._loaded_name = instance.name
+
+
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+def taxonomy_changed(sender, instance, **kwargs):
+    invalidate_taxonomy()
@@ -0,0 +1,222 @@
+"""
+Фоновые задачи каталога: пересчет похожих книг и рейтингов книг.
+
+Похожие книги. Книга описывается вектором по читателям: избранное дает вес 1, отзыв — оценку / 5 (если
+читатель и добавил книгу в избранное, и оставил отзыв, веса складываются). Близость двух книг — косинус угла
+между векторами: скалярное произведение по общим читателям, деленное на нормы векторов. Произведение
+разреженной матрицы читатели × книги на себя считает база одним запросом с группировкой; в память
+загружаются только ненулевые пары с книгами пачки.
+
+Пересчитываются только книги из очереди SimilarBookQueue, куда их ставят изменения избранного и отзывов.
+Близость симметрична, поэтому вместе со списком книги пачки обновляется и ее место в списках соседей.
+Если книга пачки выпала из списка соседа или опустилась в нем, ее место может занять книга, которой
+в списке не было; такие соседи ставятся в очередь и пересчитываются следующим запуском.
+
+Рейтинги книг пересчитываются целиком: места считает оконная функция в базе, и результат записывается
+одним INSERT ... SELECT на каждый рейтинг и раздел, без загрузки книг в память.
+"""
+import heapq
+from collections import defaultdict
+from operator import itemgetter
+
+from celery import shared_task
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, DateTimeField, ExpressionWrapper, F, FloatField, Q, Sum, Value, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from book.caching import invalidate_books
+from book.models import Book, Favorite, LeaderboardEntry, Review, SimilarBook, SimilarBookQueue
+
+INTERACTIONS_SQL = """
+    SELECT user_id, book_id, SUM(weight) AS weight FROM (
+        SELECT user_id, book_id, 1.0 AS weight FROM {favorite} WHERE {condition}
+        UNION ALL
+        SELECT user_id, book_id, rating / 5.0 AS weight FROM {review} WHERE {condition}
+    ) source
+    GROUP BY user_id, book_id
+"""
+
+SIMILARITY_SQL = """
+    WITH batch AS ({batch}),
+    neighbors AS ({neighbors}),
+    norms AS (
+        SELECT book_id, SQRT(SUM(weight * weight)) AS norm FROM ({norms}) vectors GROUP BY book_id
+    )
+    SELECT batch.book_id, neighbors.book_id, SUM(batch.weight * neighbors.weight) / (batch_norm.norm * norm.norm)
+    FROM batch
+    JOIN neighbors ON neighbors.user_id = batch.user_id AND neighbors.book_id <> batch.book_id
+    JOIN norms batch_norm ON batch_norm.book_id = batch.book_id
+    JOIN norms norm ON norm.book_id = neighbors.book_id
+    GROUP BY batch.book_id, neighbors.book_id, batch_norm.norm, norm.norm
+    HAVING COUNT(*) >= %s
+"""
+
+
+def interactions(condition):
+    return INTERACTIONS_SQL.format(
+        favorite=Favorite._meta.db_table, review=Review._meta.db_table, condition=condition)
+
+
+def similarities(book_ids):
+    """
+    Возвращает {книга пачки: {другая книга: близость}} для книг, у которых не меньше SIMILAR_BOOKS_MIN_USERS
+    общих читателей. Векторы читаются только для читателей книг пачки и книг этих читателей.
+    """
+    placeholders = ', '.join(['%s'] * len(book_ids))
+    sql = SIMILARITY_SQL.format(
+        batch=interactions(f'book_id IN ({placeholders})'),
+        neighbors=interactions('user_id IN (SELECT user_id FROM batch)'),
+        norms=interactions('book_id IN (SELECT book_id FROM neighbors)'),
+    )
+    scores = defaultdict(dict)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [*book_ids, *book_ids, settings.SIMILAR_BOOKS_MIN_USERS])
+        for book_id, other_id, score in cursor:
+            scores[book_id][other_id] = float(score)
+    return scores
+
+
+@transaction.atomic
+def update_similar_books(book_ids):
+    """
+    Пересчитывает похожие книги для книг пачки и их место в списках похожих других книг.
+    """
+    count = settings.SIMILAR_BOOKS_COUNT
+    batch = set(book_ids)
+    scores = similarities(book_ids)
+
+    stale = SimilarBook.objects.filter(Q(book_id__in=batch) | Q(similar_id__in=batch))
+    # Прежние места книг пачки в списках соседей
+    previous = {(book_id, similar_id): score for book_id, similar_id, score in
+                stale.exclude(book_id__in=batch).values_list('book_id', 'similar_id', 'score')}
+    changed = batch | {book_id for book_id, similar_id in previous}
+    stale.delete()
+
+    entries = []
+    candidates = defaultdict(list)
+    for book_id in batch:
+        for other_id, score in heapq.nlargest(count, scores[book_id].items(), key=itemgetter(1)):
+            entries.append(SimilarBook(book_id=book_id, similar_id=other_id, score=score))
+        for other_id, score in scores[book_id].items():
+            if other_id not in batch:
+                candidates[other_id].append((book_id, score))
+
+    # Книга пачки попадает в список соседа, если в нем есть место или она ближе самой далекой книги списка
+    current = defaultdict(list)
+    kept_pairs = set()
+    for book_id, score in SimilarBook.objects.filter(book_id__in=candidates).values_list('book_id', 'score'):
+        current[book_id].append(score)
+    for other_id, pairs in candidates.items():
+        kept = heapq.nlargest(count, current[other_id] + [score for book_id, score in pairs])
+        threshold = kept[-1]
+        added = [(book_id, score) for book_id, score in pairs if score >= threshold]
+        if added:
+            changed.add(other_id)
+            entries += [SimilarBook(book_id=other_id, similar_id=book_id, score=score) for book_id, score in added]
+            kept_pairs.update((other_id, book_id) for book_id, score in added)
+    SimilarBook.objects.bulk_create(entries)
+    SimilarBookQueue.objects.mark({
+        book_id for (book_id, similar_id), score in previous.items()
+        if (book_id, similar_id) not in kept_pairs or scores[similar_id][book_id] < score
+    })
+
+    # При равных оценках список соседа мог вырасти больше SIMILAR_BOOKS_COUNT
+    overflow = defaultdict(list)
+    for pk, book_id, score in SimilarBook.objects.filter(
+            book_id__in=changed - batch).order_by('book_id', '-score', 'pk').values_list('pk', 'book_id', 'score'):
+        overflow[book_id].append(pk)
+    extra = [pk for pks in overflow.values() for pk in pks[count:]]
+    if extra:
+        SimilarBook.objects.filter(pk__in=extra).delete()
+
+    invalidate_books(changed)
+    return len(entries)
+
+
+@shared_task
+def rebuild_similar_books():
+    """
+    Пересчитывает похожие книги для книг из очереди пачками по SIMILAR_BOOKS_BATCH и возвращает их количество.
+
+    Книги, отмеченные во время пересчета, остаются в очереди до следующего запуска.
+    """
+    started = timezone.now()
+    queue = SimilarBookQueue.objects.filter(marked_at__lte=started)
+    processed = 0
+    while True:
+        book_ids = list(queue.order_by('marked_at').values_list('book_id', flat=True)[:settings.SIMILAR_BOOKS_BATCH])
+        if not book_ids:
+            return processed
+        update_similar_books(book_ids)
+        queue.filter(book_id__in=book_ids).delete()
+        processed += len(book_ids)
+
+
+# Раздел рейтинга -> поле книги, по которому книги делятся на разделы
+LEADERBOARD_SCOPES = {
+    LeaderboardEntry.ALL: None,
+    LeaderboardEntry.GENRE: 'genre_id',
+    LeaderboardEntry.AUTHOR: 'author_id',
+}
+LEADERBOARD_COLUMNS = ('kind', 'scope', 'scope_id', 'rank', 'book_id', 'score', 'refreshed_at')
+
+
+def leaderboard_scores():
+    """
+    Возвращает {рейтинг: (книги-участники, выражение оценки)}.
+
+    Байесовский рейтинг (C * m + сумма оценок) / (C + количество отзывов) приближает оценку книги с малым числом
+    отзывов к среднему по каталогу m, поэтому книга с одной пятеркой не обгоняет книги с сотнями отзывов.
+    C — LEADERBOARD_PRIOR_REVIEWS, сколько средних оценок добавляется каждой книге.
+    """
+    favorites = Count('favorite')
+    boards = {LeaderboardEntry.FAVORITED: (Book.objects.annotate(favorites=favorites).filter(favorites__gt=0),
+                                           F('favorites'))}
+    totals = Book.objects.aggregate(reviews=Sum('reviews_count'), ratings=Sum('rating_sum'))
+    if totals['reviews']:
+        prior = float(settings.LEADERBOARD_PRIOR_REVIEWS)
+        mean = totals['ratings'] / totals['reviews']
+        score = ExpressionWrapper((Value(prior * mean) + F('rating_sum')) / (Value(prior) + F('reviews_count')),
+                                  output_field=FloatField())
+        boards[LeaderboardEntry.RATED] = (Book.objects.filter(reviews_count__gt=0), score)
+    return boards
+
+
+@shared_task
+def refresh_leaderboards():
+    """
+    Пересчитывает рейтинги: LEADERBOARD_SIZE первых книг каждого рейтинга среди всех книг, в каждом жанре
+    и у каждого автора. Старые места заменяются в одной транзакции, читатели видят либо старые, либо новые.
+    Возвращает количество записанных мест.
+    """
+    refreshed_at = timezone.now()
+    quote = connection.ops.quote_name
+    insert = 'INSERT INTO {table} ({columns}) SELECT {aliases} FROM ({query}) ranked'.format(
+        table=quote(LeaderboardEntry._meta.db_table),
+        columns=', '.join(quote(column) for column in LEADERBOARD_COLUMNS),
+        aliases=', '.join(quote(f'lb_{column}') for column in LEADERBOARD_COLUMNS),
+        query='{query}',
+    )
+
+    inserted = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        LeaderboardEntry.objects.all().delete()
+        for kind, (books, score) in leaderboard_scores().items():
+            for scope, partition in LEADERBOARD_SCOPES.items():
+                # Внутренний запрос читает только поля для оценки и разделов, а не все колонки книги
+                ranked = books.only('id', 'genre_id', 'author_id', 'rating_sum', 'reviews_count').annotate(
+                    lb_kind=Value(kind),
+                    lb_scope=Value(scope),
+                    lb_scope_id=F(partition) if partition else Value(0),
+                    lb_rank=Window(RowNumber(), partition_by=[F(partition)] if partition else None,
+                                   order_by=[score.desc(), F('id').asc()]),
+                    lb_book_id=F('id'),
+                    lb_score=score,
+                    lb_refreshed_at=Value(refreshed_at, output_field=DateTimeField()),
+                ).filter(lb_rank__lte=settings.LEADERBOARD_SIZE)
+                query, params = ranked.query.sql_with_params()
+                cursor.execute(insert.format(query=query), params)
+                inserted += cursor.rowcount
+    return inserted
@@ -1,3 +1,1153 @@
-from django.test import TestCase
+import datetime
+import io
+import json
+import os
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.contrib import admin
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, connection, transaction
+from django.db.models import QuerySet
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, APITestCase
+
+from account.models import CustomUser
+from book.admin import FavoriteAdmin
+from book.management.commands.import_catalog import iter_json_array
+from book.models import Author, Book, Favorite, Genre, LeaderboardEntry, Review, SimilarBook, SimilarBookQueue
+from book.readers import BookReader, FavoriteReader
+from book.serializers import BookSerializer, FavoriteSerializer
+from book.tasks import rebuild_similar_books, refresh_leaderboards
+from book.views import ReviewViewSet
+from core import metrics
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class BookAPITestCase(APITestCase):
+    """
+    Базовый класс тестов API каталога: кэш ответов в памяти процесса, пустой перед каждым тестом.
+    """
+
+    def setUp(self):
+        cache.clear()
+
+
+class QueryBudgetTestCase(BookAPITestCase):
+    """
+    Базовый класс для тестов, ограничивающих количество SQL-запросов эндпоинта.
+
+    Бюджет задается в QUERY_BUDGETS и не должен зависеть от количества книг в ответе.
+    """
+
+    QUERY_BUDGETS = {}
+
+    def assertWithinBudget(self, name, url, method='get', **kwargs):
+        budget = self.QUERY_BUDGETS[name]
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(self.client, method)(url, **kwargs)
+        queries = '\n'.join(query['sql'] for query in context.captured_queries)
+        self.assertLessEqual(
+            len(context), budget,
+            f'{name}: {len(context)} SQL-запросов при бюджете {budget}:\n{queries}',
+        )
+        return response
+
+
+def create_catalog(books_count, user=None):
+    genre = Genre.objects.create(name='Детективы')
+    author = Author.objects.create(full_name='Агата Кристи')
+    reviewer = CustomUser.objects.create_user(email=f'reviewer{books_count}@example.com', password='password')
+    books = []
+    for number in range(books_count):
+        book = Book.objects.create(
+            title=f'Книга {number}', genre=genre, author=author,
+            publication_date=datetime.date(1970, 1, 1) + datetime.timedelta(days=number),
+            description='Описание',
+        )
+        Review.objects.create(book=book, user=reviewer, rating=number % 5 + 1, text='Отзыв')
+        if user is not None:
+            Favorite.objects.create(user=user, book=book)
+        books.append(book)
+    return books
+
+
+class BookRatingAggregatesTest(BookAPITestCase):
+    """
+    Количество отзывов, сумма оценок и средний рейтинг книги при любом способе изменения отзывов.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.book, self.other_book = create_catalog(2)
+        Review.objects.all().delete()
+        self.users = [CustomUser.objects.create_user(email=f'reader{number}@example.com', password='password')
+                      for number in range(3)]
+
+    def assertAggregates(self, book, reviews_count, rating_sum, average_rating):
+        book.refresh_from_db()
+        self.assertEqual((book.reviews_count, book.rating_sum, book.average_rating),
+                         (reviews_count, rating_sum, average_rating))
+
+    def test_save_and_delete(self):
+        review = Review.objects.create(book=self.book, user=self.users[0], rating=5, text='Отзыв')
+        Review.objects.create(book=self.book, user=self.users[1], rating=2, text='Отзыв')
+        self.assertAggregates(self.book, 2, 7, 3.5)
+
+        review.rating = 3
+        review.save()
+        self.assertAggregates(self.book, 2, 5, 2.5)
+
+        # Перенос отзыва пересчитывает обе книги
+        review.book = self.other_book
+        review.save()
+        self.assertAggregates(self.book, 1, 2, 2.0)
+        self.assertAggregates(self.other_book, 1, 3, 3.0)
+
+        review.delete()
+        self.assertAggregates(self.other_book, 0, 0, None)
+
+    def test_bulk_create(self):
+        Review.objects.bulk_create([
+            Review(book=self.book, user=self.users[0], rating=4, text='Отзыв'),
+            Review(book=self.book, user=self.users[1], rating=5, text='Отзыв'),
+            Review(book=self.other_book, user=self.users[2], rating=1, text='Отзыв'),
+        ])
+        self.assertAggregates(self.book, 2, 9, 4.5)
+        self.assertAggregates(self.other_book, 1, 1, 1.0)
+
+    def test_update_and_bulk_update(self):
+        reviews = Review.objects.bulk_create([
+            Review(book=self.book, user=user, rating=4, text='Отзыв') for user in self.users
+        ])
+        Review.objects.filter(user=self.users[0]).update(rating=1)
+        self.assertAggregates(self.book, 3, 9, 3.0)
+
+        Review.objects.filter(user=self.users[1]).update(book=self.other_book)
+        self.assertAggregates(self.book, 2, 5, 2.5)
+        self.assertAggregates(self.other_book, 1, 4, 4.0)
+
+        for review in reviews:
+            review.rating = 5
+        Review.objects.bulk_update(reviews, ['rating'])
+        self.assertAggregates(self.book, 2, 10, 5.0)
+        self.assertAggregates(self.other_book, 1, 5, 5.0)
+
+    def test_queryset_delete(self):
+        Review.objects.bulk_create([
+            Review(book=self.book, user=user, rating=rating, text='Отзыв')
+            for user, rating in zip(self.users, [1, 2, 3])
+        ])
+        Review.objects.filter(rating__lte=2).delete()
+        self.assertAggregates(self.book, 1, 3, 3.0)
+        Review.objects.all().delete()
+        self.assertAggregates(self.book, 0, 0, None)
+
+    def test_rebuild_command_detects_and_repairs_drift(self):
+        Review.objects.create(book=self.book, user=self.users[0], rating=4, text='Отзыв')
+        call_command('rebuild_book_ratings', '--check', stdout=io.StringIO())
+
+        # Прямой UPDATE в обход ReviewQuerySet и сигналов
+        Book.objects.filter(pk=self.book.pk).update(reviews_count=5, rating_sum=1, average_rating=0.2)
+        Book.objects.filter(pk=self.other_book.pk).update(average_rating=3.0)
+        output = io.StringIO()
+        with self.assertRaisesMessage(CommandError, 'Найдено книг с неверными агрегатами: 2'):
+            call_command('rebuild_book_ratings', '--check', stdout=output)
+        self.assertIn(f'Книга {self.book.pk}:', output.getvalue())
+
+        call_command('rebuild_book_ratings', '--batch-size', '1', stdout=io.StringIO())
+        self.assertAggregates(self.book, 1, 4, 4.0)
+        self.assertAggregates(self.other_book, 0, 0, None)
+        call_command('rebuild_book_ratings', '--check', stdout=io.StringIO())
+
+
+class BookEndpointsQueryBudgetTest(QueryBudgetTestCase):
+    QUERY_BUDGETS = {
+        'home': 1,
+        'home_authenticated': 2,
+        'home_cached': 0,
+        'home_cached_authenticated': 1,
+        'detail': 3,
+        'detail_cached': 0,
+        'favorites': 2,
+        'favorites_not_modified': 1,
+    }
+
+    def setUp(self):
+        super().setUp()
+        self.user = CustomUser.objects.create_user(email='reader@example.com', password='password')
+
+    def test_home_anonymous(self):
+        for books_count in (2, 20):
+            with self.subTest(books_count=books_count):
+                Book.objects.all().delete()
+                cache.clear()
+                create_catalog(books_count)
+                response = self.assertWithinBudget('home', '/api/books/home/')
+                self.assertEqual(response.status_code, 200)
+                self.assertWithinBudget('home_cached', '/api/books/home/')
+
+    def test_home_authenticated(self):
+        books = create_catalog(10, user=self.user)
+        self.client.force_authenticate(self.user)
+        response = self.assertWithinBudget('home_authenticated', '/api/books/home/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(all(item['is_favorite'] for item in response.data['results']))
+        self.assertEqual(len(response.data['results']), len(books))
+        self.assertWithinBudget('home_cached_authenticated', '/api/books/home/')
+
+    def test_detail(self):
+        book = create_catalog(1)[0]
+        reviewers = [
+            CustomUser.objects.create_user(email=f'user{number}@example.com', password='password')
+            for number in range(5)
+        ]
+        for reviewer in reviewers:
+            Review.objects.create(book=book, user=reviewer, rating=5, text='Отзыв')
+        response = self.assertWithinBudget('detail', f'/api/books/book-detail/{book.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['reviews']), 6)
+        self.assertWithinBudget('detail_cached', f'/api/books/book-detail/{book.pk}/')
+
+    def test_favorites(self):
+        create_catalog(10, user=self.user)
+        self.client.force_authenticate(self.user)
+        response = self.assertWithinBudget('favorites', '/api/books/favorite/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 10)
+        response = self.assertWithinBudget('favorites_not_modified', '/api/books/favorite/',
+                                           HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+
+@override_settings(STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+class AdminChangelistQueryBudgetTest(QueryBudgetTestCase):
+    """
+    Списки книг, отзывов и избранного в админ-панели: количество запросов не зависит от числа строк.
+    """
+
+    # Сессия и пользователь, количество строк, строки страницы; у книг — годы и месяцы для date_hierarchy
+    QUERY_BUDGETS = {
+        'books': 6,
+        'reviews': 4,
+        'favorites': 4,
+    }
+
+    def setUp(self):
+        super().setUp()
+        self.user = CustomUser.objects.create_user(email='reader@example.com', password='password')
+        self.books = create_catalog(30, self.user)
+        self.client.force_login(CustomUser.objects.create_superuser(email='admin@example.com', password='password'))
+
+    def test_changelists(self):
+        for name, url in [('books', '/admin/book/book/'), ('reviews', '/admin/book/review/'),
+                          ('favorites', '/admin/book/favorite/')]:
+            with self.subTest(name=name):
+                response = self.assertWithinBudget(name, url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.context['cl'].result_count, 30)
+
+    def test_search(self):
+        response = self.assertWithinBudget('books', '/admin/book/book/?q=Книга 7')
+        self.assertEqual(list(response.context['cl'].result_list), [self.books[7]])
+        response = self.assertWithinBudget('favorites', f'/admin/book/favorite/?q={self.books[3].pk}')
+        self.assertEqual([favorite.book_id for favorite in response.context['cl'].result_list], [self.books[3].pk])
+        response = self.assertWithinBudget('favorites', '/admin/book/favorite/?q=reader@example.com')
+        self.assertEqual(response.context['cl'].result_count, 30)
+        response = self.assertWithinBudget('favorites', '/admin/book/favorite/?q=²')
+        self.assertEqual(response.context['cl'].result_count, 0)
+
+    def test_date_hierarchy(self):
+        response = self.assertWithinBudget('books', '/admin/book/book/?publication_date__year=1970')
+        self.assertEqual(response.context['cl'].result_count, 30)
+
+
+class HomePaginationTest(BookAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        create_catalog(7)
+        # Книги с одинаковой датой упорядочиваются по id
+        Book.objects.filter(pk__in=Book.objects.order_by('pk').values('pk')[:3]).update(
+            publication_date=datetime.date(1980, 1, 1))
+
+    def collect(self, url, link):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append([item['id'] for item in response.data['results']])
+            url = response.data[link]
+        return pages
+
+    def test_pages_cover_catalog_in_stable_order(self):
+        expected = list(Book.objects.order_by('-publication_date', '-id').values_list('id', flat=True))
+        pages = self.collect('/api/books/home/?page_size=3', 'next')
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual(sum(pages, []), expected)
+
+    def test_previous_link_returns_to_earlier_pages(self):
+        first = self.client.get('/api/books/home/?page_size=3').data
+        second = self.client.get(first['next']).data
+        self.assertIsNotNone(second['previous'])
+        back = self.client.get(second['previous']).data
+        self.assertEqual(back['results'], first['results'])
+
+    @override_settings(MAX_PAGE_SIZE=3)
+    def test_page_size_is_capped(self):
+        response = self.client.get('/api/books/home/?page_size=100000')
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertIsNotNone(response.data['next'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/books/home/?cursor=garbage')
+        self.assertEqual(response.status_code, 404)
+
+
+class CatalogCacheTest(BookAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.book = create_catalog(2)[0]
+        self.other_book = Book.objects.exclude(pk=self.book.pk).get()
+        self.user = CustomUser.objects.create_user(email='reader@example.com', password='password')
+
+    def test_favorites_are_not_shared_between_users(self):
+        Favorite.objects.create(user=self.user, book=self.book)
+        self.client.force_authenticate(self.user)
+        favorites = {item['id']: item['is_favorite'] for item in self.client.get('/api/books/home/').data['results']}
+        self.assertEqual(favorites, {self.book.pk: True, self.other_book.pk: False})
+
+        self.client.force_authenticate(None)
+        results = self.client.get('/api/books/home/').data['results']
+        self.assertTrue(all('is_favorite' not in item for item in results))
+
+    def test_review_invalidates_listing_and_only_its_book_detail(self):
+        self.client.get('/api/books/home/')
+        self.client.get(f'/api/books/book-detail/{self.book.pk}/')
+        self.client.get(f'/api/books/book-detail/{self.other_book.pk}/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(book=self.book, user=self.user, rating=1, text='Отзыв')
+
+        with self.assertNumQueries(1):
+            results = self.client.get('/api/books/home/').data['results']
+        self.assertEqual(next(item for item in results if item['id'] == self.book.pk)['reviews_count'], 2)
+        with self.assertNumQueries(3):
+            self.client.get(f'/api/books/book-detail/{self.book.pk}/')
+        with self.assertNumQueries(0):
+            self.client.get(f'/api/books/book-detail/{self.other_book.pk}/')
+
+    def test_genre_change_invalidates_every_detail(self):
+        self.client.get(f'/api/books/book-detail/{self.book.pk}/')
+        with self.captureOnCommitCallbacks(execute=True):
+            Genre.objects.filter(pk=self.book.genre_id).get().save()
+        with self.assertNumQueries(3):
+            self.client.get(f'/api/books/book-detail/{self.book.pk}/')
+
+
+class HomeFilterTest(BookAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        author = Author.objects.create(full_name='Автор')
+        self.genres = [Genre.objects.create(name=f'Жанр {number}') for number in range(13)]
+        self.books = {
+            genre.pk: Book.objects.create(
+                title=genre.name, genre=genre, author=author, description='Описание',
+                publication_date=datetime.date(1960 + number, 1, 1),
+            )
+            for number, genre in enumerate(self.genres)
+        }
+
+    def get_ids(self, query):
+        response = self.client.get(f'/api/books/home/?{query}')
+        self.assertEqual(response.status_code, 200, response.data)
+        return {item['id'] for item in response.data['results']}
+
+    def test_multi_digit_id(self):
+        genre = self.genres[11]
+        self.assertEqual(self.get_ids(f'genre_id={genre.pk}'), {self.books[genre.pk].pk})
+
+    def test_comma_separated_and_repeated_ids(self):
+        first, second = self.genres[1], self.genres[12]
+        expected = {self.books[first.pk].pk, self.books[second.pk].pk}
+        self.assertEqual(self.get_ids(f'genre_id={first.pk},{second.pk}'), expected)
+        self.assertEqual(self.get_ids(f'genre_id={first.pk}&genre_id={second.pk}'), expected)
+
+    def test_open_ended_date_ranges(self):
+        self.assertEqual(len(self.get_ids('start_date=1970-01-01')), 3)
+        self.assertEqual(len(self.get_ids('end_date=1961-12-31')), 2)
+        self.assertEqual(len(self.get_ids('start_date=1961-01-01&end_date=1962-01-01')), 2)
+
+    def test_invalid_input_is_rejected_before_sql(self):
+        for query in ('genre_id=abc', 'author_id=1,-2', 'start_date=1970-13-45',
+                      'start_date=1970-01-01&end_date=1960-01-01'):
+            with self.subTest(query=query), self.assertNumQueries(0):
+                response = self.client.get(f'/api/books/home/?{query}')
+                self.assertEqual(response.status_code, 400)
+
+
+class HomeFacetsTest(BookAPITestCase):
+    """
+    Счетчики книг по жанрам, авторам и десятилетиям при текущих фильтрах.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.genres = [Genre.objects.create(name=f'Жанр {number}') for number in range(2)]
+        self.authors = [Author.objects.create(full_name=f'Автор {number}') for number in range(2)]
+        for number, year in enumerate([1958, 1961, 1969, 1970, 1984]):
+            Book.objects.create(
+                title=f'Книга {number}', genre=self.genres[number % 2], author=self.authors[number // 3],
+                publication_date=datetime.date(year, 1, 1), description='Описание',
+            )
+
+    def test_counts_under_filters(self):
+        genre = self.genres[0]
+        response = self.client.get('/api/books/home/', {'genre_id': genre.pk, 'facets': 'genre,author,decade'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['facets'], {
+            'genre': [{'id': genre.pk, 'name': genre.name, 'count': 3}],
+            'author': [
+                {'id': self.authors[0].pk, 'full_name': 'Автор 0', 'count': 2},
+                {'id': self.authors[1].pk, 'full_name': 'Автор 1', 'count': 1},
+            ],
+            'decade': [{'decade': 1950, 'count': 1}, {'decade': 1960, 'count': 1}, {'decade': 1980, 'count': 1}],
+        })
+
+    def test_only_requested_facets(self):
+        response = self.client.get('/api/books/home/?facets=decade&start_date=1960-01-01')
+        self.assertEqual(response.data['facets'], {
+            'decade': [{'decade': 1960, 'count': 2}, {'decade': 1970, 'count': 1}, {'decade': 1980, 'count': 1}],
+        })
+        self.assertNotIn('facets', self.client.get('/api/books/home/').data)
+
+    @override_settings(HOME_FACETS_MAX_VALUES=1)
+    def test_values_are_limited_except_decades(self):
+        response = self.client.get('/api/books/home/?facets=genre,decade')
+        self.assertEqual(response.data['facets'], {
+            'genre': [{'id': self.genres[0].pk, 'name': 'Жанр 0', 'count': 3}],
+            'decade': [{'decade': 1950, 'count': 1}, {'decade': 1960, 'count': 2}, {'decade': 1970, 'count': 1},
+                       {'decade': 1980, 'count': 1}],
+        })
+
+    def test_single_query_shared_by_pages(self):
+        with self.assertNumQueries(2):
+            first = self.client.get('/api/books/home/?facets=genre,author&page_size=2').data
+        with self.assertNumQueries(1):
+            second = self.client.get(first['next'] + '&facets=author,genre').data
+        self.assertEqual(second['facets'], first['facets'])
+
+    def test_invalid_facet_is_rejected_before_sql(self):
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/books/home/?facets=genre,year')
+        self.assertEqual(response.status_code, 400)
+
+    def test_async_endpoint(self):
+        query = '?author_id=%s&facets=genre,decade' % self.authors[1].pk
+        self.assertEqual(self.client.get('/api/books/async/home/' + query).json()['facets'],
+                         self.client.get('/api/books/home/' + query).json()['facets'])
+
+
+class HomeSearchTest(BookAPITestCase):
+
+    def test_search_by_title_description_and_author(self):
+        genre = Genre.objects.create(name='Детективы')
+        christie = Author.objects.create(full_name='Агата Кристи')
+        other = Author.objects.create(full_name='Другой автор')
+        paddington = Book.objects.create(title='В 4:50 с вокзала Паддингтон', genre=genre, author=christie,
+                                         publication_date=datetime.date(1957, 1, 1), description='Мисс Марпл')
+        marple = Book.objects.create(title='Другая книга', genre=genre, author=other,
+                                     publication_date=datetime.date(1960, 1, 1), description='Снова мисс Марпл')
+        Book.objects.create(title='Третья книга', genre=genre, author=other,
+                            publication_date=datetime.date(1961, 1, 1), description='Описание')
+
+        def search(value):
+            response = self.client.get('/api/books/home/', {'search': value, 'page_size': 1})
+            self.assertEqual(response.status_code, 200)
+            ids = [item['id'] for item in response.data['results']]
+            while response.data['next']:
+                response = self.client.get(response.data['next'])
+                ids += [item['id'] for item in response.data['results']]
+            return set(ids)
+
+        self.assertEqual(search('Паддингтон'), {paddington.pk})
+        self.assertEqual(search('Марпл'), {paddington.pk, marple.pk})
+        self.assertEqual(search('Кристи'), {paddington.pk})
+
+
+class FavoriteBulkTest(BookAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = CustomUser.objects.create_user(email='reader@example.com', password='password')
+        self.books = create_catalog(3)
+        self.client.force_authenticate(self.user)
+
+    def test_bulk_add(self):
+        first, second, third = self.books
+        Favorite.objects.create(user=self.user, book=first)
+        with self.assertNumQueries(3):
+            response = self.client.post('/api/books/favorite/bulk-add/',
+                                        {'book_ids': [first.pk, second.pk, third.pk, 999999, second.pk]},
+                                        format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [
+            {'book_id': first.pk, 'status': 'exists'},
+            {'book_id': second.pk, 'status': 'added'},
+            {'book_id': third.pk, 'status': 'added'},
+            {'book_id': 999999, 'status': 'not_found'},
+        ])
+        self.assertEqual(Favorite.objects.filter(user=self.user).count(), 3)
+
+    def test_bulk_remove(self):
+        first, second, _ = self.books
+        Favorite.objects.create(user=self.user, book=first)
+        with self.assertNumQueries(3):
+            response = self.client.post('/api/books/favorite/bulk-remove/',
+                                        {'book_ids': [first.pk, second.pk]}, format='json')
+        self.assertEqual(response.data['results'], [
+            {'book_id': first.pk, 'status': 'removed'},
+            {'book_id': second.pk, 'status': 'not_found'},
+        ])
+        self.assertFalse(Favorite.objects.filter(user=self.user).exists())
+
+    def test_request_size_is_capped(self):
+        with self.assertNumQueries(0):
+            response = self.client.post('/api/books/favorite/bulk-add/',
+                                        {'book_ids': list(range(1, 10002))}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class FavoriteListTest(BookAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = CustomUser.objects.create_user(email='reader@example.com', password='password')
+        self.books = create_catalog(5, user=self.user)
+        self.client.force_authenticate(self.user)
+
+    def test_pages_newest_first_with_joined_book(self):
+        response = self.client.get('/api/books/favorite/?page_size=3')
+        first_page = response.data['results']
+        self.assertEqual([item['book']['id'] for item in first_page], [book.pk for book in self.books[:-4:-1]])
+        self.assertEqual(first_page[0]['book']['genre']['name'], 'Детективы')
+        second_page = self.client.get(response.data['next']).data['results']
+        self.assertEqual([item['book']['id'] for item in second_page], [self.books[1].pk, self.books[0].pk])
+
+    def test_etag_changes_with_favorites(self):
+        etag = self.client.get('/api/books/favorite/')['ETag']
+        self.assertTrue(etag.startswith('W/'))
+
+        Favorite.objects.filter(user=self.user, book=self.books[0]).delete()
+        removed_etag = self.client.get('/api/books/favorite/', HTTP_IF_NONE_MATCH=etag)['ETag']
+        self.assertNotEqual(removed_etag, etag)
+
+        Favorite.objects.create(user=self.user, book=self.books[0])
+        response = self.client.get('/api/books/favorite/', HTTP_IF_NONE_MATCH=removed_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(response['ETag'], (etag, removed_etag))
+
+    def test_pages_have_different_etags(self):
+        # Асинхронный эндпоинт аутентифицирует только по токену
+        CustomUser.objects.filter(pk=self.user.pk).update(is_active=True)
+        self.client.force_authenticate(None)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user).key}')
+        for url in ('/api/books/favorite/', '/api/books/async/favorite/'):
+            with self.subTest(url=url):
+                first = self.client.get(url, {'page_size': 2})
+                second = self.client.get(first.json()['next'], HTTP_IF_NONE_MATCH=first['ETag'])
+                self.assertEqual(second.status_code, 200)
+                self.assertEqual([item['book']['id'] for item in second.json()['results']],
+                                 [self.books[2].pk, self.books[1].pk])
+                self.assertNotEqual(second['ETag'], first['ETag'])
+                self.assertEqual(self.client.get(first.json()['next'], HTTP_IF_NONE_MATCH=second['ETag']).status_code,
+                                 304)
+                # Другой размер страницы — другой ETag
+                self.assertEqual(self.client.get(url, {'page_size': 3}, HTTP_IF_NONE_MATCH=first['ETag']).status_code,
+                                 200)
+
+
+class BookReviewsTest(BookAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.book = create_catalog(1)[0]
+        for number in range(4):
+            reviewer = CustomUser.objects.create_user(email=f'user{number}@example.com', password='password')
+            Review.objects.create(book=self.book, user=reviewer, rating=4, text=f'Отзыв {number}')
+        self.review_ids = list(Review.objects.filter(book=self.book).order_by('-id').values_list('id', flat=True))
+
+    def test_detail_embeds_latest_reviews(self):
+        with self.settings(BOOK_DETAIL_REVIEWS=2):
+            response = self.client.get(f'/api/books/book-detail/{self.book.pk}/')
+        self.assertEqual([review['id'] for review in response.data['reviews']], self.review_ids[:2])
+        self.assertEqual(response.data['reviews'][0]['user'], 'user3@example.com')
+        self.assertEqual(response.data['reviews_count'], 5)
+
+    def test_reviews_endpoint_pages(self):
+        url = f'/api/books/book-detail/{self.book.pk}/reviews/?page_size=3'
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        ids = [review['id'] for review in response.data['results']]
+        ids += [review['id'] for review in self.client.get(response.data['next']).data['results']]
+        self.assertEqual(ids, self.review_ids)
+
+    def test_reviews_of_missing_book(self):
+        self.assertEqual(self.client.get('/api/books/book-detail/999999/reviews/').status_code, 404)
+        self.assertEqual(self.client.get('/api/books/book-detail/abc/reviews/').status_code, 404)
+
+
+class ReviewWriteTest(BookAPITestCase):
+    """
+    Создание, изменение и удаление отзывов через API с проверками на уровне базы.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.user = CustomUser.objects.create_user(email='critic@example.com', password='password', is_active=True)
+        self.book, self.other_book = create_catalog(2)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user).key}')
+
+    def create_review(self, **data):
+        return self.client.post('/api/books/review/', {'book': self.book.pk, 'rating': 5, 'text': 'Отлично', **data},
+                                format='json')
+
+    def test_create_updates_book_rating(self):
+        response = self.create_review()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {'id': response.json()['id'], 'book': self.book.pk, 'rating': 5,
+                                           'text': 'Отлично'})
+        self.book.refresh_from_db()
+        # Отзыв из create_catalog с оценкой 1 и новый с оценкой 5
+        self.assertEqual((self.book.reviews_count, self.book.average_rating), (2, 3.0))
+        self.assertEqual(self.client.get(f'/api/books/book-detail/{self.book.pk}/').json()['average_rating'], 3.0)
+
+    def test_duplicate_review_is_rejected_by_constraint(self):
+        self.create_review()
+        response = self.create_review(rating=1)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('book', response.json())
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.reviews_count, 2)
+
+    def test_unrelated_integrity_error_is_not_masked(self):
+        serializer = mock.Mock()
+        serializer.save.side_effect = IntegrityError('FOREIGN KEY constraint failed')
+        with self.assertRaises(IntegrityError):
+            ReviewViewSet.save(serializer, user=self.user)
+
+    def test_rating_range(self):
+        self.assertEqual(self.create_review(rating=6).status_code, 400)
+        self.assertEqual(self.create_review(rating=0).status_code, 400)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Review.objects.create(book=self.book, user=self.user, rating=6, text='Мимо валидаторов')
+
+    def test_update_and_delete(self):
+        review_id = self.create_review().json()['id']
+        url = f'/api/books/review/{review_id}/'
+        self.assertEqual(self.client.patch(url, {'rating': 3}, format='json').status_code, 200)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.average_rating, 2.0)
+        self.assertEqual(self.client.patch(url, {'book': self.other_book.pk}, format='json').status_code, 400)
+
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.reviews_count, self.book.average_rating), (1, 1.0))
+
+    def test_only_own_reviews(self):
+        other = Review.objects.get(book=self.book)
+        self.assertEqual(self.client.patch(f'/api/books/review/{other.pk}/', {'rating': 1},
+                                           format='json').status_code, 404)
+        self.assertEqual(self.client.get('/api/books/review/').json()['results'], [])
+        self.client.credentials()
+        self.assertEqual(self.create_review().status_code, 401)
+
+
+@override_settings(SIMILAR_BOOKS_MIN_USERS=1)
+class SimilarBooksTest(BookAPITestCase):
+    """
+    Похожие книги по совместному избранному и отзывам, пересчет только измененных книг.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.books = create_catalog(4)
+        Review.objects.all().delete()
+        self.users = [
+            CustomUser.objects.create_user(email=f'reader{number}@example.com', password='password')
+            for number in range(3)
+        ]
+        first, second, third = self.users
+        Favorite.objects.bulk_create([Favorite(user=first, book=book) for book in self.books[:2]])
+        for book in self.books[:3]:
+            Favorite.objects.create(user=second, book=book)
+        Review.objects.create(user=third, book=self.books[2], rating=5, text='Отзыв')
+        Review.objects.create(user=third, book=self.books[3], rating=5, text='Отзыв')
+
+    def queued(self):
+        queue = SimilarBookQueue.objects.all()
+        book_ids = set(queue.values_list('book_id', flat=True))
+        queue.delete()
+        return book_ids
+
+    def similar(self, book):
+        return [(item['id'], item['score'])
+                for item in self.client.get(f'/api/books/book-detail/{book.pk}/').json()['similar_books']]
+
+    def test_rebuild(self):
+        self.assertEqual(rebuild_similar_books(), 4)
+        self.assertFalse(SimilarBookQueue.objects.exists())
+        self.assertEqual(self.similar(self.books[0]), [(self.books[1].pk, 1.0), (self.books[2].pk, 0.5)])
+        self.assertEqual(self.similar(self.books[3]), [(self.books[2].pk, 0.707)])
+
+    def test_only_changed_books_are_rebuilt(self):
+        rebuild_similar_books()
+        self.assertEqual(self.similar(self.books[3]), [(self.books[2].pk, 0.707)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Favorite.objects.create(user=self.users[2], book=self.books[0])
+            self.assertEqual(rebuild_similar_books(), 1)
+        self.assertEqual(self.similar(self.books[0]),
+                         [(self.books[1].pk, 0.816), (self.books[2].pk, 0.816), (self.books[3].pk, 0.577)])
+        # Близость симметрична: книга попадает и в список похожих соседа, который не пересчитывался
+        self.assertEqual(self.similar(self.books[3]), [(self.books[2].pk, 0.707), (self.books[0].pk, 0.577)])
+
+    @override_settings(SIMILAR_BOOKS_COUNT=1)
+    def test_lists_are_limited(self):
+        rebuild_similar_books()
+        Favorite.objects.create(user=self.users[2], book=self.books[0])
+        rebuild_similar_books()
+        self.assertEqual(SimilarBook.objects.filter(book=self.books[3]).count(), 1)
+        self.assertEqual(self.similar(self.books[0]), [(self.books[1].pk, 0.816)])
+
+    @override_settings(SIMILAR_BOOKS_COUNT=1)
+    def test_neighbour_list_is_refilled(self):
+        rebuild_similar_books()
+        self.assertEqual(self.similar(self.books[0]), [(self.books[1].pk, 1.0)])
+
+        # Вторая книга выпадает из списка первой; ее следующего соседа знает только пересчет первой книги
+        Favorite.objects.filter(book=self.books[1]).delete()
+        SimilarBookQueue.objects.mark([self.books[1].pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(rebuild_similar_books(), 1)
+            self.assertEqual(list(SimilarBookQueue.objects.values_list('book_id', flat=True)), [self.books[0].pk])
+            self.assertEqual(rebuild_similar_books(), 1)
+        self.assertEqual(self.similar(self.books[0]), [(self.books[2].pk, 0.5)])
+
+    def test_deletes_outside_api_are_queued(self):
+        rebuild_similar_books()
+
+        FavoriteAdmin(Favorite, admin.site).delete_queryset(
+            RequestFactory().post('/'), Favorite.objects.filter(book=self.books[2]))
+        self.assertEqual(self.queued(), {self.books[2].pk})
+
+        self.users[0].delete()
+        self.assertEqual(self.queued(), {self.books[0].pk, self.books[1].pk})
+
+        # Четвертая книга была только в списке третьей
+        self.books[3].delete()
+        self.assertEqual(self.queued(), {self.books[2].pk})
+
+
+class LeaderboardTest(BookAPITestCase):
+    """
+    Рейтинги книг: байесовский рейтинг, количество добавлений в избранное, разделы жанра и автора.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.single, self.many = create_catalog(2)
+        Review.objects.all().delete()
+        self.other = Book.objects.create(
+            title='Другая книга', genre=Genre.objects.create(name='Фантастика'),
+            author=Author.objects.create(full_name='Станислав Лем'),
+            publication_date=datetime.date(1961, 1, 1), description='Описание',
+        )
+        users = [CustomUser.objects.create_user(email=f'reader{number}@example.com', password='password')
+                 for number in range(5)]
+        # Одна пятерка против пяти оценок со средним 4.8: байесовский рейтинг выше у второй книги
+        Review.objects.create(user=users[0], book=self.single, rating=5, text='Отзыв')
+        for user, rating in zip(users, [5, 5, 5, 5, 4]):
+            Review.objects.create(user=user, book=self.many, rating=rating, text='Отзыв')
+            Review.objects.create(user=user, book=self.other, rating=2, text='Отзыв')
+        for user in users[:3]:
+            Favorite.objects.create(user=user, book=self.other)
+        Favorite.objects.create(user=users[0], book=self.many)
+
+    def ranking(self, url):
+        return [(item['rank'], item['book']['id']) for item in self.client.get(url).json()['results']]
+
+    def test_rated(self):
+        self.assertEqual(refresh_leaderboards(), 15)
+        self.assertEqual(self.ranking('/api/books/leaderboard/'),
+                         [(1, self.many.pk), (2, self.single.pk), (3, self.other.pk)])
+        response = self.client.get('/api/books/leaderboard/', {'page_size': 1}).json()
+        self.assertEqual(response['kind'], LeaderboardEntry.RATED)
+        self.assertIsNotNone(response['refreshed_at'])
+        home = self.client.get('/api/books/home/').json()['results']
+        book = next(item for item in home if item['id'] == self.many.pk)
+        self.assertEqual(response['results'], [{'rank': 1, 'score': 3.964, 'book': book}])
+
+    def test_favorited(self):
+        refresh_leaderboards()
+        self.assertEqual(self.ranking('/api/books/leaderboard/?kind=favorited'),
+                         [(1, self.other.pk), (2, self.many.pk)])
+
+    def test_scopes(self):
+        refresh_leaderboards()
+        self.assertEqual(self.ranking(f'/api/books/leaderboard/author/{self.many.author_id}/'),
+                         [(1, self.many.pk), (2, self.single.pk)])
+        self.assertEqual(self.ranking(f'/api/books/leaderboard/genre/{self.other.genre_id}/?kind=favorited'),
+                         [(1, self.other.pk)])
+        self.assertEqual(self.ranking('/api/books/leaderboard/genre/0/'), [])
+
+    @override_settings(LEADERBOARD_SIZE=1)
+    def test_refresh_replaces_entries(self):
+        refresh_leaderboards()
+        Review.objects.filter(book=self.many).delete()
+        refresh_leaderboards()
+        self.assertEqual(self.ranking('/api/books/leaderboard/'), [(1, self.single.pk)])
+        self.assertEqual(LeaderboardEntry.objects.filter(kind=LeaderboardEntry.RATED).count(), 5)
+
+    def test_single_query(self):
+        refresh_leaderboards()
+        with self.assertNumQueries(1):
+            self.client.get('/api/books/leaderboard/')
+
+    def test_invalid_kind(self):
+        response = self.client.get('/api/books/leaderboard/?kind=newest')
+        self.assertEqual(response.status_code, 400)
+
+
+class ReaderTest(BookAPITestCase):
+    """
+    Быстрые ридеры должны давать тот же JSON, что и сериализаторы DRF.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.user = CustomUser.objects.create_user(email='reader@example.com', password='password')
+        create_catalog(3, user=self.user)
+        book = Book.objects.first()
+        Book.objects.create(title='Без отзывов', genre=book.genre, author=book.author,
+                            publication_date=datetime.date(2000, 2, 29), description='Описание "в кавычках"')
+        self.request = APIRequestFactory().get('/api/books/home/')
+
+    def test_book_reader_matches_serializer(self):
+        books = Book.objects.select_related('genre', 'author').order_by('id')
+        expected = BookSerializer(books, many=True, context={'request': self.request}).data
+        actual = BookReader(self.request).many(books.values(*BookReader.values))
+        self.assertEqual(JSONRenderer().render(actual), JSONRenderer().render(expected))
+
+    def test_favorite_reader_matches_serializer(self):
+        favorites = Favorite.objects.filter(user=self.user).select_related('book__genre', 'book__author')
+        expected = FavoriteSerializer(favorites.order_by('id'), many=True).data
+        actual = FavoriteReader().many(favorites.order_by('id').values(*FavoriteReader.values))
+        self.assertEqual(JSONRenderer().render(actual), JSONRenderer().render(expected))
+
+
+class BookExportTest(BookAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.books = create_catalog(3)
+
+    def read(self, response):
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_ndjson(self):
+        lines = self.read(self.client.get('/api/books/export/')).splitlines()
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual({row['id'] for row in rows}, {book.pk for book in self.books})
+        self.assertEqual(rows[0]['genre']['name'], 'Детективы')
+        self.assertIn('updated_at', rows[0])
+
+    def test_incremental_export(self):
+        rows = [json.loads(line) for line in self.read(self.client.get('/api/books/export/')).splitlines()]
+        since = timezone.now() + datetime.timedelta(hours=1)
+        Book.objects.filter(pk=self.books[0].pk).update(updated_at=since)
+        lines = self.read(self.client.get('/api/books/export/', {'since': since.isoformat()})).splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines], [self.books[0].pk])
+        self.assertEqual(len(rows), 3)
+
+    def test_only_renames_touch_books(self):
+        stamped = timezone.now() - datetime.timedelta(days=1)
+        Book.objects.update(updated_at=stamped)
+        genre, author = Genre.objects.get(pk=self.books[0].genre_id), Author.objects.get(pk=self.books[0].author_id)
+        genre.save()
+        author.save()
+        self.assertFalse(Book.objects.exclude(updated_at=stamped).exists())
+
+        genre.name = 'Классический детектив'
+        genre.save()
+        self.assertEqual(Book.objects.exclude(updated_at=stamped).count(), Book.objects.filter(genre=genre).count())
+
+    @override_settings(BOOKS_EXPORT_SINCE_LAG=60)
+    def test_next_since_covers_late_commits(self):
+        response = self.client.get('/api/books/export/')
+        self.read(response)
+        next_since = datetime.datetime.fromisoformat(response['X-Next-Since'])
+        self.assertLessEqual(next_since, timezone.now() - datetime.timedelta(seconds=60))
+
+        # Транзакция отметила книгу до предыдущей выгрузки, а зафиксировалась после нее
+        Book.objects.filter(pk=self.books[1].pk).update(updated_at=timezone.now() - datetime.timedelta(seconds=30))
+        lines = self.read(self.client.get('/api/books/export/', {'since': response['X-Next-Since']})).splitlines()
+        self.assertIn(self.books[1].pk, [json.loads(line)['id'] for line in lines])
+
+    def test_csv(self):
+        lines = self.read(self.client.get('/api/books/export/?format=csv')).splitlines()
+        self.assertTrue(lines[0].startswith('id,url,title,publication_date'))
+        self.assertEqual(len(lines), 4)
+
+    def test_invalid_since(self):
+        self.assertEqual(self.client.get('/api/books/export/?since=вчера').status_code, 400)
+
+
+class ImportCatalogTest(BookAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.user = CustomUser.objects.create_user(email='reader@gmail.com', password='1234')
+
+    def write(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def book(self, number, **extra):
+        return dict({
+            'title': f'Книга {number}', 'genre': 'Детективы', 'author': 'Агата Кристи',
+            'publication_date': '1970-01-01', 'description': 'Описание',
+        }, **extra)
+
+    def test_json_array_is_parsed_across_chunks(self):
+        records = [{'title': 'Книга ' * number, 'tags': [1, {'a': '],['}]} for number in range(5)]
+        stream = io.StringIO(' \n' + json.dumps(records, ensure_ascii=False, indent=2))
+        self.assertEqual(list(iter_json_array(stream, chunk_size=7)), records)
+
+    def test_ndjson_with_reviews(self):
+        lines = [
+            self.book(1, reviews=[{'user': 'reader@gmail.com', 'rating': 4, 'text': 'Отлично'},
+                                  {'user': 'nobody@gmail.com', 'rating': 1, 'text': 'Нет автора'}]),
+            self.book(2, genre='Фэнтези'),
+            self.book(3),
+        ]
+        path = self.write('books.ndjson', '\n'.join(json.dumps(line, ensure_ascii=False) for line in lines))
+        call_command('import_catalog', path, batch_size=2, stdout=io.StringIO())
+
+        self.assertEqual(Book.objects.count(), 3)
+        self.assertEqual(sorted(Genre.objects.values_list('name', flat=True)), ['Детективы', 'Фэнтези'])
+        self.assertEqual(Author.objects.count(), 1)
+        book = Book.objects.get(title='Книга 1')
+        self.assertEqual((book.reviews_count, book.average_rating), (1, 4.0))
+        self.assertFalse(os.path.exists(f'{path}.checkpoint'))
+
+    def test_csv(self):
+        path = self.write('books.csv', 'title,genre,author,publication_date,description\n'
+                                       'Книга 1,Детективы,Агата Кристи,1970-01-01,"Описание, с запятой"\n')
+        call_command('import_catalog', path, stdout=io.StringIO())
+        self.assertEqual(Book.objects.get().description, 'Описание, с запятой')
+
+    def test_resume_after_invalid_record(self):
+        lines = [self.book(1), self.book(2), self.book(3, publication_date='никогда'), self.book(4)]
+        path = self.write('books.json', json.dumps(lines, ensure_ascii=False))
+        with self.assertRaises(CommandError):
+            call_command('import_catalog', path, batch_size=2, stdout=io.StringIO())
+        self.assertEqual(Book.objects.count(), 2)
+
+        lines[2]['publication_date'] = '1970-01-03'
+        self.write('books.json', json.dumps(lines, ensure_ascii=False))
+        call_command('import_catalog', path, batch_size=2, stdout=io.StringIO())
+        self.assertEqual(sorted(Book.objects.values_list('title', flat=True)),
+                         ['Книга 1', 'Книга 2', 'Книга 3', 'Книга 4'])
+
+    def test_fixture(self):
+        Genre.objects.create(name='Детективы')
+        records = [
+            {'model': 'book.genre', 'pk': 7, 'fields': {'name': 'Детективы'}},
+            {'model': 'book.author', 'pk': 7, 'fields': {'full_name': 'Агата Кристи'}},
+            {'model': 'book.book', 'pk': 10, 'fields': dict(self.book(1), genre=7, author=7)},
+            {'model': 'book.review', 'pk': 5, 'fields': {'book': 10, 'user': self.user.pk, 'rating': 5, 'text': 'Да'}},
+            {'model': 'book.favorite', 'pk': 1, 'fields': {'book': 10, 'user': self.user.pk}},
+        ]
+        path = self.write('data.json', json.dumps(records, ensure_ascii=False))
+        call_command('import_catalog', path, stdout=io.StringIO())
+        call_command('import_catalog', path, stdout=io.StringIO())
+
+        self.assertEqual(Genre.objects.count(), 1)
+        book = Book.objects.get()
+        self.assertEqual((book.pk, book.genre.name, book.reviews_count), (10, 'Детективы', 1))
+        self.assertEqual(Review.objects.get().pk, 5)
+
+    def test_fixture_reimport_is_exported_and_moves_reviews(self):
+        records = [
+            {'model': 'book.genre', 'pk': 7, 'fields': {'name': 'Детективы'}},
+            {'model': 'book.author', 'pk': 7, 'fields': {'full_name': 'Агата Кристи'}},
+            {'model': 'book.book', 'pk': 10, 'fields': dict(self.book(1), genre=7, author=7)},
+            {'model': 'book.book', 'pk': 11, 'fields': dict(self.book(2), genre=7, author=7)},
+            {'model': 'book.review', 'pk': 5, 'fields': {'book': 10, 'user': self.user.pk, 'rating': 5, 'text': 'Да'}},
+        ]
+        path = self.write('data.json', json.dumps(records, ensure_ascii=False))
+        call_command('import_catalog', path, stdout=io.StringIO())
+        Book.objects.update(updated_at=timezone.now() - datetime.timedelta(days=30))
+        since = timezone.now()
+
+        records[2]['fields']['title'] = 'Новое название'
+        records[4]['fields']['book'] = 11
+        self.write('data.json', json.dumps(records, ensure_ascii=False))
+        call_command('import_catalog', path, stdout=io.StringIO())
+
+        response = self.client.get('/api/books/export/', {'since': since.isoformat()})
+        titles = {json.loads(line)['title'] for line in b''.join(response.streaming_content).decode().splitlines()}
+        self.assertEqual(titles, {'Новое название', 'Книга 2'})
+        self.assertEqual(dict(Book.objects.values_list('pk', 'reviews_count')), {10: 0, 11: 1})
+
+
+class AsyncEndpointsTest(BookAPITestCase):
+    """
+    Асинхронные эндпоинты отвечают так же, как синхронные.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.user = CustomUser.objects.create_user(email='reader@example.com', password='password', is_active=True)
+        self.books = create_catalog(5, user=self.user)
+        Favorite.objects.filter(book=self.books[0]).delete()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user).key}')
+
+    def assertSameResponse(self, sync_url, async_url, **kwargs):
+        cache.clear()
+        expected = self.client.get(sync_url, **kwargs)
+        cache.clear()
+        actual = self.client.get(async_url, **kwargs)
+        self.assertEqual(actual.status_code, expected.status_code)
+        # Ссылки на страницы ведут на тот же вариант эндпоинта
+        self.assertEqual(json.loads(actual.content.decode().replace('/async/', '/')), expected.json())
+        return actual
+
+    def test_home(self):
+        response = self.assertSameResponse('/api/books/home/?page_size=2', '/api/books/async/home/?page_size=2')
+        self.assertSameResponse(response.json()['next'].replace('/async/', '/'), response.json()['next'])
+        self.assertSameResponse('/api/books/home/?genre_id=x', '/api/books/async/home/?genre_id=x')
+        self.client.credentials()
+        self.assertSameResponse('/api/books/home/?search=Книга', '/api/books/async/home/?search=Книга')
+
+    def test_detail(self):
+        self.assertSameResponse(f'/api/books/book-detail/{self.books[1].pk}/',
+                                f'/api/books/async/book-detail/{self.books[1].pk}/')
+        self.assertEqual(self.client.get('/api/books/async/book-detail/999999/').status_code, 404)
+
+    def test_favorites(self):
+        response = self.assertSameResponse('/api/books/favorite/', '/api/books/async/favorite/')
+        self.assertEqual(self.client.get('/api/books/async/favorite/',
+                                         HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        response = self.client.post('/api/books/async/favorite/', {'book_id': self.books[0].pk}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['book']['id'], self.books[0].pk)
+        response = self.client.post('/api/books/async/favorite/', {'book_id': self.books[0].pk}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        self.assertEqual(self.client.delete(f'/api/books/async/favorite/{self.books[0].pk}/').status_code, 204)
+        self.assertEqual(self.client.delete(f'/api/books/async/favorite/{self.books[0].pk}/').status_code, 404)
+
+        self.client.credentials()
+        self.assertEqual(self.client.get('/api/books/async/favorite/').status_code, 401)
+
+    def test_concurrent_favorite_is_rejected(self):
+        Favorite.objects.get_or_create(user=self.user, book=self.books[0])
+        favorites = Favorite.objects.count()
+        get = QuerySet.get
+
+        def missed(queryset, *args, **kwargs):
+            # Параллельный запрос добавил книгу уже после проверки get_or_create
+            if queryset.model is Favorite:
+                raise Favorite.DoesNotExist
+            return get(queryset, *args, **kwargs)
+
+        with mock.patch.object(QuerySet, 'get', missed):
+            for url in ('/api/books/favorite/', '/api/books/async/favorite/'):
+                with self.subTest(url=url):
+                    response = self.client.post(url, {'book_id': self.books[0].pk}, format='json')
+                    self.assertEqual(response.status_code, 400)
+                    self.assertEqual(response.json(), {'error': 'Книга уже добавлена в избранное'})
+        self.assertEqual(Favorite.objects.count(), favorites)
+
+
+class MetricsTest(BookAPITestCase):
+    """
+    Метрики запросов по представлениям и обнаружение N+1.
+    """
+
+    def setUp(self):
+        super().setUp()
+        metrics._pending.clear()
+        metrics._views.clear()
+        self.books = create_catalog(3)
+        admin = CustomUser.objects.create_superuser(email='admin@example.com', password='password')
+        self.admin_token = Token.objects.create(user=admin).key
+
+    def get_metrics(self, **kwargs):
+        response = self.client.get('/metrics/', HTTP_AUTHORIZATION=f'Token {self.admin_token}', **kwargs)
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode().splitlines()
+
+    def test_requests_are_measured_per_view(self):
+        self.client.get('/api/books/home/')
+        self.client.get('/api/books/home/')
+        self.client.get(f'/api/books/book-detail/{self.books[0].pk}/')
+        self.client.get('/api/books/async/home/')
+
+        lines = self.get_metrics()
+        self.assertIn('http_request_duration_seconds_count{view="HomeViewSetList.list"} 2', lines)
+        self.assertIn('http_request_duration_seconds_count{view="BookViewSetDetail.retrieve"} 1', lines)
+        self.assertIn('http_request_duration_seconds_count{view="async_views.home"} 1', lines)
+        # Вторая страница каталога отдана из кэша: SQL-запросов нет
+        self.assertIn('http_request_db_queries_bucket{view="HomeViewSetList.list",le="0"} 1', lines)
+        sums = {line.split()[0]: float(line.split()[1]) for line in lines if '_sum{' in line}
+        self.assertGreater(sums['http_request_serialization_duration_seconds_sum{view="HomeViewSetList.list"}'], 0)
+        self.assertGreater(sums['http_request_db_duration_seconds_sum{view="BookViewSetDetail.retrieve"}'], 0)
+        self.assertIn('auth_token_cache_lookups_total{result="misses"} 1', lines)
+
+    @override_settings(METRICS_N_PLUS_ONE_THRESHOLD=3)
+    def test_repeated_queries_are_flagged(self):
+        def view(request):
+            for book in self.books:
+                Book.objects.get(pk=book.pk)
+            return HttpResponse()
+
+        with self.assertLogs('core.metrics', 'WARNING') as logs:
+            metrics.MetricsMiddleware(view)(RequestFactory().get('/books/'))
+        self.assertIn('выполнен 3 раз', logs.output[0])
+        self.assertIn('http_request_n_plus_one_total{view="unresolved"} 1', self.get_metrics())
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+                                           'LOCATION': 'redis://localhost:6379/1'}})
+    def test_redis_counters_are_flushed_in_one_round_trip(self):
+        with mock.patch('django.core.cache.backends.redis.RedisCacheClient.get_client') as get_client:
+            metrics.increment_many({'metrics:a': 1, 'metrics:b': 2})
+        pipeline = get_client.return_value.pipeline.return_value.__enter__.return_value
+        self.assertEqual(pipeline.incrby.call_args_list, [mock.call(':1:metrics:a', 1), mock.call(':1:metrics:b', 2)])
+        pipeline.execute.assert_called_once_with()
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_access(self):
+        self.assertEqual(self.client.get('/metrics/').status_code, 401)
+        self.assertEqual(self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer wrong').status_code, 401)
+        self.assertEqual(self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
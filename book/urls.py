@@ -2,14 +2,29 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from book.views import HomeViewSetList, BookViewSetDetail, FavoriteViewSet
+from book import async_views
+from book.models import LeaderboardEntry
+from book.views import (HomeViewSetList, BookViewSetDetail, FavoriteViewSet, ReviewViewSet, BookExportView,
+                        LeaderboardView)
 
 router = DefaultRouter()
 router.register('home', HomeViewSetList)
 router.register('book-detail', BookViewSetDetail)
 router.register('favorite', FavoriteViewSet)
+router.register('review', ReviewViewSet, basename='review')
 
 # Define URL patterns
 urlpatterns = [
+    path('export/', BookExportView.as_view(), name='book-export'),
+    path('leaderboard/', LeaderboardView.as_view(), name='leaderboard'),
+    path('leaderboard/genre/<int:scope_id>/', LeaderboardView.as_view(scope=LeaderboardEntry.GENRE),
+         name='leaderboard-genre'),
+    path('leaderboard/author/<int:scope_id>/', LeaderboardView.as_view(scope=LeaderboardEntry.AUTHOR),
+         name='leaderboard-author'),
+    # Асинхронные варианты эндпоинтов для развертывания под ASGI
+    path('async/home/', async_views.home, name='async-home'),
+    path('async/book-detail/<int:pk>/', async_views.book_detail, name='async-book-detail'),
+    path('async/favorite/', async_views.favorites, name='async-favorite'),
+    path('async/favorite/<int:pk>/', async_views.favorite_detail, name='async-favorite-detail'),
     path('', include(router.urls)),
 ]
@@ -0,0 +1,292 @@
+"""
+Метрики запросов по представлениям в формате Prometheus.
+
+Для каждого запроса MetricsMiddleware записывает время обработки, количество и время SQL-запросов,
+время аутентификации и сериализации (построение данных ответа и рендеринг). Метрики группируются
+по представлению: HomeViewSetList.list, BookViewSetDetail.retrieve, async_views.home и т. д.
+
+SQL-запросы считает обертка execute_wrapper, которая ставится на каждое соединение с базой. Запрос,
+в котором один и тот же SQL выполнен не меньше METRICS_N_PLUS_ONE_THRESHOLD раз, считается
+подозрительным на N+1: он пишется в журнал и увеличивает счетчик http_request_n_plus_one_total.
+
+Гистограммы копятся в процессе и раз в METRICS_FLUSH запросов переносятся в общий кэш (Redis),
+поэтому /metrics/ (core.views.MetricsView) отдает сумму по всем воркерам. В Redis все счетчики
+переносятся одним конвейером INCRBY, то есть за один обмен с сервером.
+"""
+import contextvars
+import logging
+import threading
+import time
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.redis import RedisCache
+from django.db import connection
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+METRIC_KEY = 'metrics:{}'
+VIEWS_KEY = 'metrics:views'
+
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# Имя измерения -> имя гистограммы, описание, границы корзин и множитель для хранения суммы целым числом
+HISTOGRAMS = {
+    'duration': ('http_request_duration_seconds', 'Время обработки запроса.', TIME_BUCKETS, 10 ** 6),
+    'queries': ('http_request_db_queries', 'Количество SQL-запросов на запрос.', QUERY_BUCKETS, 1),
+    'db': ('http_request_db_duration_seconds', 'Время SQL-запросов на запрос.', TIME_BUCKETS, 10 ** 6),
+    'auth': ('http_request_auth_duration_seconds', 'Время аутентификации.', TIME_BUCKETS, 10 ** 6),
+    'serialization': ('http_request_serialization_duration_seconds',
+                      'Время сериализации и рендеринга ответа.', TIME_BUCKETS, 10 ** 6),
+}
+N_PLUS_ONE = 'n_plus_one'
+
+current = contextvars.ContextVar('request_metrics', default=None)
+
+_pending = Counter()
+_views = set()
+_lock = threading.Lock()
+
+
+class RequestMetrics:
+    """
+    Измерения одного запроса.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.timings = Counter()
+        self.statements = Counter()
+
+    @property
+    def queries(self):
+        return sum(self.statements.values())
+
+
+class measure:
+    """
+    Контекстный менеджер, прибавляющий время блока к измерению текущего запроса (auth, serialization).
+    Вне запроса ничего не делает.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        metrics = current.get()
+        if metrics is not None:
+            metrics.timings[self.name] += time.perf_counter() - self.started
+
+
+def count_queries(execute, sql, params, many, context):
+    metrics = current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.timings['db'] += time.perf_counter() - started
+        metrics.statements[sql] += 1
+
+
+def instrument(connection, **kwargs):
+    if count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_queries)
+
+
+connection_created.connect(instrument)
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    func = match.func
+    view_class = getattr(func, 'cls', None) or getattr(func, 'view_class', None)
+    if view_class is None:
+        return f'{func.__module__.rsplit(".", 1)[-1]}.{func.__qualname__}'
+    method = request.method.lower()
+    return f'{view_class.__name__}.{(getattr(func, "actions", None) or {}).get(method, method)}'
+
+
+def bucket(value, bounds):
+    for index, bound in enumerate(bounds):
+        if value <= bound:
+            return index
+    return len(bounds)
+
+
+def observe(request, metrics):
+    """
+    Добавляет измерения запроса к гистограммам процесса. Возвращает накопленные значения,
+    если их пора перенести в общий кэш.
+    """
+    view = view_name(request)
+    values = dict(metrics.timings, duration=time.perf_counter() - metrics.started, queries=metrics.queries)
+
+    sql, repeats = (metrics.statements.most_common(1) or [(None, 0)])[0]
+    if repeats >= settings.METRICS_N_PLUS_ONE_THRESHOLD:
+        logger.warning('Возможный N+1 в %s %s (%s): запрос выполнен %s раз из %s: %s',
+                       request.method, request.path, view, repeats, metrics.queries, sql)
+
+    with _lock:
+        _views.add(view)
+        for name, (metric, description, bounds, scale) in HISTOGRAMS.items():
+            value = values.get(name, 0)
+            _pending[f'{view}:{name}:{bucket(value, bounds)}'] += 1
+            _pending[f'{view}:{name}:sum'] += round(value * scale)
+        if repeats >= settings.METRICS_N_PLUS_ONE_THRESHOLD:
+            _pending[f'{view}:{N_PLUS_ONE}'] += 1
+        _pending['requests'] += 1
+        if _pending['requests'] < settings.METRICS_FLUSH:
+            return None
+        return take_pending()
+
+
+def take_pending():
+    pending, views = dict(_pending), set(_views)
+    _pending.clear()
+    _views.clear()
+    return pending, views
+
+
+def flush(pending, views):
+    """
+    Переносит значения процесса в общий кэш. Если кэш недоступен, значения возвращаются в процесс:
+    сбой метрик не должен ломать запросы.
+    """
+    pending.pop('requests', None)
+    try:
+        known = cache.get(VIEWS_KEY) or []
+        if not views.issubset(known):
+            cache.set(VIEWS_KEY, sorted(views.union(known)), timeout=None)
+        increment_many({METRIC_KEY.format(name): value for name, value in pending.items() if value})
+    except Exception:
+        logger.exception('Не удалось сохранить метрики запросов')
+        with _lock:
+            _pending.update(pending)
+            _views.update(views)
+
+
+def increment_many(values):
+    """
+    Прибавляет значения к счетчикам общего кэша; счетчики не истекают.
+    """
+    backend = caches[DEFAULT_CACHE_ALIAS]
+    if isinstance(backend, RedisCache):
+        # Целые числа RedisCache хранит без сериализации, поэтому INCRBY совместим с cache.get_many
+        client = backend._cache.get_client(write=True)
+        with client.pipeline(transaction=False) as pipeline:
+            for key, value in values.items():
+                pipeline.incrby(backend.make_and_validate_key(key), value)
+            pipeline.execute()
+        return
+    for key, value in values.items():
+        if not cache.add(key, value, timeout=None):
+            cache.incr(key, value)
+
+
+class MetricsMiddleware:
+    """
+    Измеряет запросы к представлениям. Работает и в синхронном, и в асинхронном стеке.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        instrument(connection)
+        metrics = RequestMetrics()
+        token = current.set(metrics)
+        try:
+            return self.get_response(request)
+        finally:
+            current.reset(token)
+            pending = observe(request, metrics)
+            if pending:
+                flush(*pending)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = current.set(metrics)
+        try:
+            return await self.get_response(request)
+        finally:
+            current.reset(token)
+            pending = observe(request, metrics)
+            if pending:
+                await sync_to_async(flush, thread_sensitive=False)(*pending)
+
+    def process_template_response(self, request, response):
+        # Ответы DRF рендерятся сразу после этого вызова: время рендеринга входит в сериализацию
+        metrics = current.get()
+        if metrics is not None:
+            started = time.perf_counter()
+
+            def rendered(response):
+                metrics.timings['serialization'] += time.perf_counter() - started
+
+            response.add_post_render_callback(rendered)
+        return response
+
+
+def collect():
+    """
+    Возвращает гистограммы всех процессов из общего кэша: {(представление, измерение): значения}.
+    """
+    with _lock:
+        pending = take_pending()
+    flush(*pending)
+
+    views = cache.get(VIEWS_KEY) or []
+    keys = [METRIC_KEY.format(f'{view}:{N_PLUS_ONE}') for view in views]
+    for view in views:
+        for name, (metric, description, bounds, scale) in HISTOGRAMS.items():
+            keys += [METRIC_KEY.format(f'{view}:{name}:{index}') for index in range(len(bounds) + 1)]
+            keys.append(METRIC_KEY.format(f'{view}:{name}:sum'))
+    stored = cache.get_many(keys)
+    return views, {key[len(METRIC_KEY.format('')):]: value for key, value in stored.items()}
+
+
+def label(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def render():
+    """
+    Формирует текст метрик в формате Prometheus.
+    """
+    views, values = collect()
+    lines = []
+    for name, (metric, description, bounds, scale) in HISTOGRAMS.items():
+        lines += [f'# HELP {metric} {description}', f'# TYPE {metric} histogram']
+        for view in views:
+            total = 0
+            for index, bound in enumerate(bounds + ('+Inf',)):
+                total += values.get(f'{view}:{name}:{index}', 0)
+                lines.append(f'{metric}_bucket{{view="{label(view)}",le="{bound}"}} {total}')
+            total_sum = values.get(f'{view}:{name}:sum', 0)
+            lines.append(f'{metric}_sum{{view="{label(view)}"}} {total_sum / scale if scale > 1 else total_sum}')
+            lines.append(f'{metric}_count{{view="{label(view)}"}} {total}')
+
+    metric = 'http_request_n_plus_one_total'
+    lines += [f'# HELP {metric} Запросы, в которых один SQL-запрос повторился не меньше порога N+1.',
+              f'# TYPE {metric} counter']
+    lines += [f'{metric}{{view="{label(view)}"}} {values.get(f"{view}:{N_PLUS_ONE}", 0)}' for view in views]
+    return '\n'.join(lines) + '\n'
+
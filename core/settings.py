@@ -1,3 +1,4 @@
+import datetime
 import os
 from pathlib import Path
 
@@ -7,7 +8,7 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 
 SECRET_KEY = config('SECRET_KEY').split(',')
 
-DEBUG = True
+DEBUG = config('DEBUG', default=False, cast=bool)
 
 ALLOWED_HOSTS = config('ALLOWED_HOSTS').split(',')
 
@@ -39,6 +40,10 @@ INSTALLED_APPS = DJANGO_APPS + REST_FRAMEWORK_APPS + CUSTOM_APPS
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Статика отдается самим приложением: сжатые копии и вечное кэширование файлов с хешем в имени
+    'whitenoise.middleware.WhiteNoiseMiddleware',
+    # Время, SQL-запросы, аутентификация и сериализация по представлениям; статика не измеряется
+    'core.metrics.MetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -75,6 +80,9 @@ DATABASES = {
         'PASSWORD': config('POSTGRES_PASSWORD'),
         'HOST': config('POSTGRES_HOST'),
         'PORT': config('POSTGRES_PORT', cast=int),
+        # Постоянные соединения: не открывать новое соединение с базой на каждый запрос
+        'CONN_MAX_AGE': config('CONN_MAX_AGE', default=60, cast=int),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
@@ -93,6 +101,25 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Хешер новых паролей: scrypt, argon2 (нужен argon2-cffi) или pbkdf2 (стандартный для Django).
+# Пароли, сохраненные остальными хешерами списка, по-прежнему проверяются и перехешируются при входе
+PASSWORD_HASHER = config('PASSWORD_HASHER', default='scrypt')
+PASSWORD_HASHER_CLASSES = {
+    'scrypt': 'account.hashers.ConfiguredScryptPasswordHasher',
+    'argon2': 'account.hashers.ConfiguredArgon2PasswordHasher',
+    'pbkdf2': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+}
+PASSWORD_HASHERS = [PASSWORD_HASHER_CLASSES[PASSWORD_HASHER]] + [
+    hasher for name, hasher in PASSWORD_HASHER_CLASSES.items() if name != PASSWORD_HASHER
+] + ['django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher']
+
+PASSWORD_SCRYPT_WORK_FACTOR = config('PASSWORD_SCRYPT_WORK_FACTOR', default=2 ** 14, cast=int)
+PASSWORD_SCRYPT_BLOCK_SIZE = config('PASSWORD_SCRYPT_BLOCK_SIZE', default=8, cast=int)
+PASSWORD_SCRYPT_PARALLELISM = config('PASSWORD_SCRYPT_PARALLELISM', default=1, cast=int)
+PASSWORD_ARGON2_TIME_COST = config('PASSWORD_ARGON2_TIME_COST', default=2, cast=int)
+PASSWORD_ARGON2_MEMORY_COST = config('PASSWORD_ARGON2_MEMORY_COST', default=65536, cast=int)
+PASSWORD_ARGON2_PARALLELISM = config('PASSWORD_ARGON2_PARALLELISM', default=1, cast=int)
+
 LANGUAGE_CODE = 'ru'
 
 TIME_ZONE = 'Asia/Almaty'
@@ -104,17 +131,87 @@ USE_TZ = True
 STATIC_URL = '/staticfiles/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage',
+    },
+}
+
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': config('REDIS_CACHE_URL', default='redis://redis:6379/1'),
+    }
+}
+
+# Время жизни закэшированных ответов каталога, в секундах
+BOOKS_CACHE_TIMEOUT = config('BOOKS_CACHE_TIMEOUT', default=300, cast=int)
+
+# Кэш аутентификации по токену: время жизни в общем кэше и в кэше процесса (секунды), размер кэша процесса
+AUTH_TOKEN_CACHE_TIMEOUT = config('AUTH_TOKEN_CACHE_TIMEOUT', default=300, cast=int)
+AUTH_TOKEN_LOCAL_TIMEOUT = config('AUTH_TOKEN_LOCAL_TIMEOUT', default=10, cast=int)
+AUTH_TOKEN_LOCAL_SIZE = config('AUTH_TOKEN_LOCAL_SIZE', default=10000, cast=int)
+# Через сколько обращений счетчики кэша токенов процесса переносятся в общий кэш
+AUTH_TOKEN_STATS_FLUSH = 100
+
+# Метрики запросов: через сколько запросов счетчики процесса переносятся в общий кэш, сколько повторов
+# одного SQL-запроса считаются признаком N+1 и токен сборщика метрик (заголовок Authorization: Bearer <токен>)
+METRICS_FLUSH = 100
+METRICS_N_PLUS_ONE_THRESHOLD = config('METRICS_N_PLUS_ONE_THRESHOLD', default=10, cast=int)
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# Конфигурации полнотекстового поиска PostgreSQL, по которым индексируются книги
+BOOKS_SEARCH_CONFIGS = ('russian', 'english')
+
 AUTH_USER_MODEL = 'account.CustomUser'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'account.authentication.CachedTokenAuthentication',
     ),
+    'DEFAULT_PAGINATION_CLASS': 'book.pagination.KeysetPagination',
+    'PAGE_SIZE': config('PAGE_SIZE', default=20, cast=int),
 }
 
+MAX_PAGE_SIZE = config('MAX_PAGE_SIZE', default=100, cast=int)
+
+# Максимум значений в счетчиках жанров и авторов каталога (?facets=)
+HOME_FACETS_MAX_VALUES = config('HOME_FACETS_MAX_VALUES', default=100, cast=int)
+
+# Списки админ-панели считают строки точно, только если по оценке планировщика их не больше этого числа
+ADMIN_EXACT_COUNT_LIMIT = config('ADMIN_EXACT_COUNT_LIMIT', default=10000, cast=int)
+
+# Количество последних отзывов, встроенных в детали книги
+BOOK_DETAIL_REVIEWS = config('BOOK_DETAIL_REVIEWS', default=10, cast=int)
+
+# Количество книг, читаемых из базы и отправляемых клиенту за раз при выгрузке каталога
+BOOKS_EXPORT_CHUNK_SIZE = config('BOOKS_EXPORT_CHUNK_SIZE', default=2000, cast=int)
+# На сколько секунд X-Next-Since выгрузки отстает от текущего времени: запас на транзакции, которые
+# отметили книги раньше, а зафиксировались позже
+BOOKS_EXPORT_SINCE_LAG = config('BOOKS_EXPORT_SINCE_LAG', default=300, cast=int)
+
+# Похожие книги: сколько хранить и отдавать в деталях книги, минимум общих читателей пары книг,
+# размер пачки пересчета и период запуска пересчета (минуты)
+SIMILAR_BOOKS_COUNT = config('SIMILAR_BOOKS_COUNT', default=10, cast=int)
+SIMILAR_BOOKS_MIN_USERS = config('SIMILAR_BOOKS_MIN_USERS', default=2, cast=int)
+SIMILAR_BOOKS_BATCH = 200
+SIMILAR_BOOKS_REBUILD_INTERVAL = config('SIMILAR_BOOKS_REBUILD_INTERVAL', default=15, cast=int)
+
+# Рейтинги книг: сколько мест хранить в каждом рейтинге, сколько средних оценок добавляется каждой книге
+# в байесовском рейтинге и период пересчета (минуты)
+LEADERBOARD_SIZE = config('LEADERBOARD_SIZE', default=100, cast=int)
+LEADERBOARD_PRIOR_REVIEWS = config('LEADERBOARD_PRIOR_REVIEWS', default=10, cast=int)
+LEADERBOARD_REFRESH_INTERVAL = config('LEADERBOARD_REFRESH_INTERVAL', default=10, cast=int)
+
+# Максимум книг в одном запросе массового добавления/удаления избранного
+FAVORITES_BULK_MAX_BOOKS = config('FAVORITES_BULK_MAX_BOOKS', default=500, cast=int)
+
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = config('EMAIL_HOST')
 EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=True, cast=bool)
@@ -122,7 +219,32 @@ EMAIL_PORT = config('EMAIL_PORT', cast=int)
 EMAIL_HOST_USER = config('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD')
 
+# Письма отправляются пачками: окно накопления (с), размер пачки, начальная задержка повтора (с) и число попыток
+MAIL_BATCH_WINDOW = config('MAIL_BATCH_WINDOW', default=5, cast=int)
+MAIL_BATCH_SIZE = config('MAIL_BATCH_SIZE', default=100, cast=int)
+MAIL_RETRY_BACKOFF = config('MAIL_RETRY_BACKOFF', default=30, cast=int)
+MAIL_MAX_ATTEMPTS = config('MAIL_MAX_ATTEMPTS', default=5, cast=int)
+
+
+# Срок действия токена активации (часы) и размер пачки при удалении просроченных токенов
+ACTIVATION_TOKEN_LIFETIME = config('ACTIVATION_TOKEN_LIFETIME', default=48, cast=int)
+ACTIVATION_TOKEN_CLEANUP_BATCH = 1000
+
 
 CELERY_BROKER_URL = 'redis://redis:6379'
 CELERY_TIMEZONE = "Asia/Almaty"
+CELERY_BEAT_SCHEDULE = {
+    'delete-expired-activation-tokens': {
+        'task': 'account.tasks.delete_expired_activation_tokens',
+        'schedule': datetime.timedelta(hours=1),
+    },
+    'rebuild-similar-books': {
+        'task': 'book.tasks.rebuild_similar_books',
+        'schedule': datetime.timedelta(minutes=SIMILAR_BOOKS_REBUILD_INTERVAL),
+    },
+    'refresh-leaderboards': {
+        'task': 'book.tasks.refresh_leaderboards',
+        'schedule': datetime.timedelta(minutes=LEADERBOARD_REFRESH_INTERVAL),
+    },
+}
 
@@ -3,6 +3,8 @@ from django.urls import path, include
 from drf_yasg import openapi
 from drf_yasg.views import get_schema_view
 
+from core.views import MetricsView
+
 schema_view = get_schema_view(
     openapi.Info(
         title='Book Catalog API',
@@ -14,6 +16,7 @@ schema_view = get_schema_view(
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/docs/', schema_view.with_ui()),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
     path('api/accounts/', include('account.urls')),
     path('api/books/', include('book.urls')),
 ]
@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+from rest_framework.permissions import BasePermission
+from rest_framework.views import APIView
+
+from account.authentication import STATS_NAMES, get_stats
+from core import metrics
+
+
+class HasMetricsAccess(BasePermission):
+    """
+    Метрики доступны администраторам и сборщику с заголовком Authorization: Bearer <METRICS_TOKEN>.
+    """
+
+    def has_permission(self, request, view):
+        if request.user and request.user.is_staff:
+            return True
+        header = request.headers.get('Authorization', '')
+        return bool(settings.METRICS_TOKEN) and constant_time_compare(header, f'Bearer {settings.METRICS_TOKEN}')
+
+
+class MetricsView(APIView):
+    """
+    Представление с метриками запросов и кэша аутентификации в текстовом формате Prometheus.
+
+    Методы:
+        get
+    """
+
+    permission_classes = [HasMetricsAccess]
+
+    def get(self, request):
+        stats = get_stats()
+        lines = [
+            '# HELP auth_token_cache_lookups_total Обращения к кэшу аутентификации по токену.',
+            '# TYPE auth_token_cache_lookups_total counter',
+        ] + [f'auth_token_cache_lookups_total{{result="{name}"}} {stats[name]}' for name in STATS_NAMES]
+        content = metrics.render() + '\n'.join(lines) + '\n'
+        return HttpResponse(content, content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,27 @@
+"""
+Настройки gunicorn для продакшен-режима; gunicorn читает этот файл из рабочего каталога.
+
+WSGI (синхронные воркеры с потоками):
+    gunicorn core.wsgi:application
+ASGI (воркеры uvicorn):
+    CONN_MAX_AGE=0 gunicorn core.asgi:application -k uvicorn.workers.UvicornWorker
+
+Под ASGI постоянные соединения с базой не переиспользуются между запросами и копятся
+(Django #33497), поэтому ASGI запускается с CONN_MAX_AGE=0 или за пулером соединений (PgBouncer).
+"""
+import multiprocessing
+
+# Имя config занято одноименной настройкой gunicorn
+from decouple import config as env
+
+bind = env('GUNICORN_BIND', default='0.0.0.0:2222')
+# По умолчанию 2 * ядра + 1 процесса: пока один ждет базу или Redis, другие заняты Python-кодом
+workers = env('WEB_CONCURRENCY', default=multiprocessing.cpu_count() * 2 + 1, cast=int)
+threads = env('GUNICORN_THREADS', default=2, cast=int)
+worker_class = env('GUNICORN_WORKER_CLASS', default='gthread')
+timeout = env('GUNICORN_TIMEOUT', default=30, cast=int)
+keepalive = 5
+# Перезапуск воркера после стольких запросов ограничивает рост памяти; разброс не дает всем воркерам уйти разом
+max_requests = env('GUNICORN_MAX_REQUESTS', default=2000, cast=int)
+max_requests_jitter = max_requests // 10
+accesslog = '-'